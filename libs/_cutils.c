@@ -1,5 +1,8 @@
 #include <time.h>
 #include <Python.h>
+#ifdef __linux__
+#include <sys/inotify.h>
+#endif
 #include "structmember.h"
 
 #define MAXINT 4294967295
@@ -11,12 +14,18 @@ typedef struct {
     unsigned int _size;
     unsigned long _max;
     void *_map_array;
+    /* writable buffer like mmap hold words, NULL when words malloc by self */
+    PyObject *_buffer;
 } _bitMapObject;
 
+static PyTypeObject _bitMap_Type;
+
 
 static void bitmap_dealloc(_bitMapObject *self)
 {
-    if (self->_size < 64) {
+    if (self->_buffer != NULL) {
+        Py_DECREF(self->_buffer);
+    } else if (self->_size < 64) {
         free((int *)(self->_map_array));
     } else {
         free((long *)(self->_map_array));
@@ -38,12 +47,30 @@ static int bitmap_init(_bitMapObject *self, PyObject *args, PyObject *kwds)
 {
     unsigned long max;
     unsigned int size;
-
-    static char *kwlist[] = {"max", NULL};
-
-    if (!PyArg_ParseTupleAndKeywords(args, kwds, "k", kwlist, &max)) goto error;
-
-    if (max > MAXINT) {
+    PyObject *buffer = NULL;
+    Py_ssize_t offset = 0;
+    void *memory;
+    Py_ssize_t length;
+
+    static char *kwlist[] = {"max", "buffer", "offset", NULL};
+
+    if (!PyArg_ParseTupleAndKeywords(args, kwds, "k|On", kwlist, &max, &buffer, &offset)) goto error;
+
+    if (buffer != NULL && buffer != Py_None) {
+        /* words in buffer, the buffer must not be resized or closed
+         * while bit map alive, a reference is kept until dealloc */
+        size = max > MAXINT ? 64 : 32;
+        if (PyObject_AsWriteBuffer(buffer, &memory, &length) < 0) return -1;
+        if (offset < 0 || offset % sizeof(long) ||
+                length - offset < (Py_ssize_t)((max/size + 1) * (size/8))) {
+            PyErr_SetString(PyExc_ValueError, "buffer size or offset error");
+            return -1;
+        }
+        Py_INCREF(buffer);
+        self->_buffer = buffer;
+        self->_map_array = (char *)memory + offset;
+    }
+    else if (max > MAXINT) {
         size = 64;
         unsigned long *arrays;
         arrays = (unsigned long *)malloc(sizeof(unsigned long)*(max/size + 1));
@@ -70,6 +97,187 @@ static int bitmap_init(_bitMapObject *self, PyObject *args, PyObject *kwds)
 }
 
 
+static unsigned long bitmap_length(_bitMapObject *self)
+{
+    return self->_max / self->_size + 1;
+}
+
+
+static void bitmap_setbit(_bitMapObject *self, unsigned long value)
+{
+    if (self->_size < 64) {
+        ((unsigned int *)self->_map_array)[value / 32] |= (1U << (value % 32));
+    } else {
+        ((unsigned long *)self->_map_array)[value / 64] |= (1UL << (value % 64));
+    }
+}
+
+
+static void bitmap_clearbit(_bitMapObject *self, unsigned long value)
+{
+    if (self->_size < 64) {
+        ((unsigned int *)self->_map_array)[value / 32] &= ~(1U << (value % 32));
+    } else {
+        ((unsigned long *)self->_map_array)[value / 64] &= ~(1UL << (value % 64));
+    }
+}
+
+
+static int bitmap_getbit(_bitMapObject *self, unsigned long value)
+{
+    if (self->_size < 64) {
+        return (((unsigned int *)self->_map_array)[value / 32] >> (value % 32)) & 1U;
+    } else {
+        return (((unsigned long *)self->_map_array)[value / 64] >> (value % 64)) & 1UL;
+    }
+}
+
+
+static unsigned long bitmap_word(_bitMapObject *self, unsigned long index)
+{
+    if (self->_size < 64) return ((unsigned int *)self->_map_array)[index];
+    return ((unsigned long *)self->_map_array)[index];
+}
+
+
+static unsigned long bitmap_full_word(_bitMapObject *self)
+{
+    return self->_size < 64 ? 0xffffffffUL : ~0UL;
+}
+
+
+/* find first set (or clear when invert) bit not less than start
+ * skip zero words and use count trailing zeros in word
+ * return 0 if found */
+static int bitmap_scan_forward(_bitMapObject *self, unsigned long start, int invert, unsigned long *found)
+{
+    unsigned long index, length, word, value;
+
+    if (start > self->_max) return -1;
+    length = bitmap_length(self);
+    index = start / self->_size;
+    word = bitmap_word(self, index);
+    if (invert) word = ~word & bitmap_full_word(self);
+    word &= (~0UL << (start % self->_size));
+    while (1) {
+        if (word) {
+            value = index * self->_size + __builtin_ctzl(word);
+            if (value > self->_max) return -1;
+            *found = value;
+            return 0;
+        }
+        index++;
+        if (index >= length) return -1;
+        word = bitmap_word(self, index);
+        if (invert) word = ~word & bitmap_full_word(self);
+    }
+}
+
+
+/* find last set bit not greater than start, return 0 if found */
+static int bitmap_scan_backward(_bitMapObject *self, unsigned long start, unsigned long *found)
+{
+    unsigned long index, word, bit;
+
+    if (start > self->_max) start = self->_max;
+    index = start / self->_size;
+    bit = start % self->_size;
+    word = bitmap_word(self, index);
+    if (bit < 63) word &= ((1UL << (bit + 1)) - 1);
+    while (1) {
+        if (word) {
+            *found = index * self->_size + (63 - __builtin_clzl(word));
+            return 0;
+        }
+        if (index == 0) return -1;
+        index--;
+        word = bitmap_word(self, index);
+    }
+}
+
+
+/* read value from a object like array.array without build python int
+ * return 0 success, -1 if value is negative or type not support */
+static int buffer_value(const char *buffer, Py_ssize_t index, char typecode, unsigned long *value)
+{
+    long signed_value;
+
+    switch (typecode) {
+        case 'B': *value = ((const unsigned char *)buffer)[index]; return 0;
+        case 'H': *value = ((const unsigned short *)buffer)[index]; return 0;
+        case 'I': *value = ((const unsigned int *)buffer)[index]; return 0;
+        case 'L': *value = ((const unsigned long *)buffer)[index]; return 0;
+        case 'b': signed_value = ((const signed char *)buffer)[index]; break;
+        case 'h': signed_value = ((const short *)buffer)[index]; break;
+        case 'i': signed_value = ((const int *)buffer)[index]; break;
+        case 'l': signed_value = ((const long *)buffer)[index]; break;
+        default:
+            PyErr_SetString(PyExc_TypeError, "array typecode not support");
+            return -1;
+    }
+    if (signed_value < 0) {
+        PyErr_SetString(PyExc_ValueError, "value over max size");
+        return -1;
+    }
+    *value = (unsigned long)signed_value;
+    return 0;
+}
+
+
+/* get buffer and typecode if object is array.array like
+ * return 1 if got, 0 for other objects, -1 on error */
+static int get_array_buffer(PyObject *obj, const char **buffer, Py_ssize_t *count, char *typecode)
+{
+    PyObject *code, *itemsize;
+    Py_ssize_t length, size;
+
+    if (!PyObject_CheckReadBuffer(obj) || !PyObject_HasAttrString(obj, "typecode")) return 0;
+    code = PyObject_GetAttrString(obj, "typecode");
+    if (code == NULL) return -1;
+    if (!PyString_Check(code) || PyString_Size(code) != 1) {
+        Py_DECREF(code);
+        return 0;
+    }
+    *typecode = PyString_AsString(code)[0];
+    Py_DECREF(code);
+    itemsize = PyObject_GetAttrString(obj, "itemsize");
+    if (itemsize == NULL) return -1;
+    size = PyInt_AsSsize_t(itemsize);
+    Py_DECREF(itemsize);
+    if (size <= 0) {
+        if (!PyErr_Occurred()) PyErr_SetString(PyExc_TypeError, "array itemsize error");
+        return -1;
+    }
+    if (PyObject_AsReadBuffer(obj, (const void **)buffer, &length) < 0) return -1;
+    *count = length / size;
+    return 1;
+}
+
+
+/* convert python int to bitmap value, set TypeError when not int,
+ * ValueError when over range */
+static int object_value(_bitMapObject *self, PyObject *item, unsigned long *value)
+{
+    if (!PyInt_Check(item) && !PyLong_Check(item)) {
+        PyErr_Format(PyExc_TypeError, "bitmap value must be int, not %.200s",
+                     Py_TYPE(item)->tp_name);
+        return -1;
+    }
+    *value = PyLong_AsUnsignedLong(item);
+    if (*value == (unsigned long)-1 && PyErr_Occurred()) {
+        if (PyErr_ExceptionMatches(PyExc_OverflowError)) {
+            PyErr_SetString(PyExc_ValueError, "value over max size");
+        }
+        return -1;
+    }
+    if (*value > self->_max) {
+        PyErr_SetString(PyExc_ValueError, "value over max size");
+        return -1;
+    }
+    return 0;
+}
+
+
 static PyMemberDef bitMapMembers[] = {
     {"size", T_UINT, offsetof(_bitMapObject, _size), READONLY, "Pre size bitmap"},
     {"max", T_ULONG, offsetof(_bitMapObject, _max), READONLY, "Max value of bitmap"},
@@ -147,10 +355,327 @@ static PyObject *bitmap_get(_bitMapObject *self, PyObject *args)
 }
 
 
+static PyObject *bitmap_remove(_bitMapObject *self, PyObject *args)
+{
+    unsigned long input;
+    if (!PyArg_ParseTuple(args, "k", &input)) return NULL;
+    if (input > self->_max) {
+        PyErr_SetString(PyExc_ValueError, "value over max size");
+        return NULL;
+    }
+    bitmap_clearbit(self, input);
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+
+static PyObject *bitmap_add_many(_bitMapObject *self, PyObject *args)
+{
+    PyObject *values, *iterator, *item;
+    const char *buffer;
+    Py_ssize_t count, index;
+    char typecode;
+    unsigned long value;
+    int ret;
+
+    if (!PyArg_ParseTuple(args, "O", &values)) return NULL;
+
+    ret = get_array_buffer(values, &buffer, &count, &typecode);
+    if (ret < 0) return NULL;
+    if (ret > 0) {
+        for (index = 0; index < count; index++) {
+            if (buffer_value(buffer, index, typecode, &value) < 0) return NULL;
+            if (value > self->_max) {
+                PyErr_SetString(PyExc_ValueError, "value over max size");
+                return NULL;
+            }
+            bitmap_setbit(self, value);
+        }
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+
+    iterator = PyObject_GetIter(values);
+    if (iterator == NULL) return NULL;
+    while ((item = PyIter_Next(iterator)) != NULL) {
+        ret = object_value(self, item, &value);
+        Py_DECREF(item);
+        if (ret < 0) {
+            Py_DECREF(iterator);
+            return NULL;
+        }
+        bitmap_setbit(self, value);
+    }
+    Py_DECREF(iterator);
+    if (PyErr_Occurred()) return NULL;
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+
+static PyObject *bitmap_has_many(_bitMapObject *self, PyObject *args)
+{
+    PyObject *values, *iterator, *item, *result;
+    const char *buffer;
+    Py_ssize_t count, index;
+    char typecode;
+    unsigned long value;
+    int ret;
+
+    if (!PyArg_ParseTuple(args, "O", &values)) return NULL;
+
+    ret = get_array_buffer(values, &buffer, &count, &typecode);
+    if (ret < 0) return NULL;
+    if (ret > 0) {
+        result = PyList_New(count);
+        if (result == NULL) return NULL;
+        for (index = 0; index < count; index++) {
+            if (buffer_value(buffer, index, typecode, &value) < 0) goto error;
+            if (value > self->_max) {
+                PyErr_SetString(PyExc_ValueError, "value over max size");
+                goto error;
+            }
+            item = bitmap_getbit(self, value) ? Py_True : Py_False;
+            Py_INCREF(item);
+            PyList_SET_ITEM(result, index, item);
+        }
+        return result;
+    }
+
+    result = PyList_New(0);
+    if (result == NULL) return NULL;
+    iterator = PyObject_GetIter(values);
+    if (iterator == NULL) goto error;
+    while ((item = PyIter_Next(iterator)) != NULL) {
+        ret = object_value(self, item, &value);
+        Py_DECREF(item);
+        if (ret < 0 || PyList_Append(result, bitmap_getbit(self, value) ? Py_True : Py_False) < 0) {
+            Py_DECREF(iterator);
+            goto error;
+        }
+    }
+    Py_DECREF(iterator);
+    if (PyErr_Occurred()) goto error;
+    return result;
+
+    error:
+        Py_DECREF(result);
+        return NULL;
+}
+
+
+static unsigned long bitmap_bytes(_bitMapObject *self)
+{
+    return bitmap_length(self) * (self->_size / 8);
+}
+
+
+static PyObject *bitmap_to_bytes(_bitMapObject *self)
+{
+    return PyString_FromStringAndSize((const char *)self->_map_array, bitmap_bytes(self));
+}
+
+
+static PyObject *bitmap_load(_bitMapObject *self, PyObject *args)
+{
+    const char *input;
+    int length;
+
+    if (!PyArg_ParseTuple(args, "s#", &input, &length)) return NULL;
+    if ((unsigned long)length != bitmap_bytes(self)) {
+        PyErr_SetString(PyExc_ValueError, "bytes length not match bit map");
+        return NULL;
+    }
+    memcpy(self->_map_array, input, length);
+
+    Py_INCREF(Py_None);
+    return Py_None;
+}
+
+
+static PyObject *bitmap_next_set(_bitMapObject *self, PyObject *args)
+{
+    unsigned long start, found;
+    if (!PyArg_ParseTuple(args, "k", &start)) return NULL;
+    if (bitmap_scan_forward(self, start, 0, &found) < 0) {
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+    return Py_BuildValue("k", found);
+}
+
+
+static PyObject *bitmap_next_clear(_bitMapObject *self, PyObject *args)
+{
+    unsigned long start, found;
+    if (!PyArg_ParseTuple(args, "k", &start)) return NULL;
+    if (bitmap_scan_forward(self, start, 1, &found) < 0) {
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+    return Py_BuildValue("k", found);
+}
+
+
+static PyObject *bitmap_prev_set(_bitMapObject *self, PyObject *args)
+{
+    unsigned long start, found;
+    if (!PyArg_ParseTuple(args, "k", &start)) return NULL;
+    if (bitmap_scan_backward(self, start, &found) < 0) {
+        Py_INCREF(Py_None);
+        return Py_None;
+    }
+    return Py_BuildValue("k", found);
+}
+
+
+static PyObject *bitmap_count(_bitMapObject *self)
+{
+    unsigned long index, length, count = 0;
+
+    length = bitmap_length(self);
+    if (self->_size < 64) {
+        unsigned int *arrays = (unsigned int *)self->_map_array;
+        for (index = 0; index < length; index++) {
+            count += __builtin_popcount(arrays[index]);
+        }
+    } else {
+        unsigned long *arrays = (unsigned long *)self->_map_array;
+        for (index = 0; index < length; index++) {
+            count += __builtin_popcountl(arrays[index]);
+        }
+    }
+    return Py_BuildValue("k", count);
+}
+
+
+#define BITMAP_OR 0
+#define BITMAP_AND 1
+#define BITMAP_XOR 2
+#define BITMAP_SUB 3
+
+/* word level set algebra, write result of left op right into target */
+static void bitmap_algebra(_bitMapObject *target, _bitMapObject *left, _bitMapObject *right, int op)
+{
+    unsigned long index, length;
+
+    length = bitmap_length(target);
+    if (target->_size < 64) {
+        unsigned int *t = (unsigned int *)target->_map_array;
+        unsigned int *l = (unsigned int *)left->_map_array;
+        unsigned int *r = (unsigned int *)right->_map_array;
+        for (index = 0; index < length; index++) {
+            switch (op) {
+                case BITMAP_OR: t[index] = l[index] | r[index]; break;
+                case BITMAP_AND: t[index] = l[index] & r[index]; break;
+                case BITMAP_XOR: t[index] = l[index] ^ r[index]; break;
+                default: t[index] = l[index] & ~r[index]; break;
+            }
+        }
+    } else {
+        unsigned long *t = (unsigned long *)target->_map_array;
+        unsigned long *l = (unsigned long *)left->_map_array;
+        unsigned long *r = (unsigned long *)right->_map_array;
+        for (index = 0; index < length; index++) {
+            switch (op) {
+                case BITMAP_OR: t[index] = l[index] | r[index]; break;
+                case BITMAP_AND: t[index] = l[index] & r[index]; break;
+                case BITMAP_XOR: t[index] = l[index] ^ r[index]; break;
+                default: t[index] = l[index] & ~r[index]; break;
+            }
+        }
+    }
+}
+
+
+static int bitmap_check_pair(PyObject *left, PyObject *right)
+{
+    if (!PyObject_TypeCheck(left, &_bitMap_Type) || !PyObject_TypeCheck(right, &_bitMap_Type)) return 0;
+    if (((_bitMapObject *)left)->_max != ((_bitMapObject *)right)->_max) {
+        PyErr_SetString(PyExc_ValueError, "bit map max value not match");
+        return -1;
+    }
+    return 1;
+}
+
+
+static PyObject *bitmap_binary(PyObject *left, PyObject *right, int op)
+{
+    PyObject *result;
+    int ret;
+
+    ret = bitmap_check_pair(left, right);
+    if (ret < 0) return NULL;
+    if (ret == 0) {
+        Py_INCREF(Py_NotImplemented);
+        return Py_NotImplemented;
+    }
+    /* call type of left to build result, so subclass init is called */
+    result = PyObject_CallFunction((PyObject *)Py_TYPE(left), "k", ((_bitMapObject *)left)->_max);
+    if (result == NULL) return NULL;
+    if (!PyObject_TypeCheck(result, &_bitMap_Type)) {
+        Py_DECREF(result);
+        PyErr_SetString(PyExc_TypeError, "bit map type error");
+        return NULL;
+    }
+    bitmap_algebra((_bitMapObject *)result, (_bitMapObject *)left, (_bitMapObject *)right, op);
+    return result;
+}
+
+
+static PyObject *bitmap_inplace(PyObject *left, PyObject *right, int op)
+{
+    int ret;
+
+    ret = bitmap_check_pair(left, right);
+    if (ret < 0) return NULL;
+    if (ret == 0) {
+        Py_INCREF(Py_NotImplemented);
+        return Py_NotImplemented;
+    }
+    bitmap_algebra((_bitMapObject *)left, (_bitMapObject *)left, (_bitMapObject *)right, op);
+    Py_INCREF(left);
+    return left;
+}
+
+
+static PyObject *bitmap_or(PyObject *left, PyObject *right) { return bitmap_binary(left, right, BITMAP_OR); }
+static PyObject *bitmap_and(PyObject *left, PyObject *right) { return bitmap_binary(left, right, BITMAP_AND); }
+static PyObject *bitmap_xor(PyObject *left, PyObject *right) { return bitmap_binary(left, right, BITMAP_XOR); }
+static PyObject *bitmap_sub(PyObject *left, PyObject *right) { return bitmap_binary(left, right, BITMAP_SUB); }
+static PyObject *bitmap_ior(PyObject *left, PyObject *right) { return bitmap_inplace(left, right, BITMAP_OR); }
+static PyObject *bitmap_iand(PyObject *left, PyObject *right) { return bitmap_inplace(left, right, BITMAP_AND); }
+static PyObject *bitmap_ixor(PyObject *left, PyObject *right) { return bitmap_inplace(left, right, BITMAP_XOR); }
+static PyObject *bitmap_isub(PyObject *left, PyObject *right) { return bitmap_inplace(left, right, BITMAP_SUB); }
+
+
+static PyNumberMethods bitMapAsNumber = {
+    .nb_subtract = (binaryfunc)bitmap_sub,
+    .nb_and = (binaryfunc)bitmap_and,
+    .nb_xor = (binaryfunc)bitmap_xor,
+    .nb_or = (binaryfunc)bitmap_or,
+    .nb_inplace_subtract = (binaryfunc)bitmap_isub,
+    .nb_inplace_and = (binaryfunc)bitmap_iand,
+    .nb_inplace_xor = (binaryfunc)bitmap_ixor,
+    .nb_inplace_or = (binaryfunc)bitmap_ior,
+};
+
+
 static PyMethodDef bitMapMethods[] = {
     {"add", (PyCFunction)bitmap_add, METH_VARARGS, "Add value into bit map"},
     {"has", (PyCFunction)bitmap_has, METH_VARARGS, "If has value in bit map, return True"},
     {"get", (PyCFunction)bitmap_get, METH_VARARGS, "Get one bitmap from arrays"},
+    {"remove", (PyCFunction)bitmap_remove, METH_VARARGS, "Remove value from bit map"},
+    {"add_many", (PyCFunction)bitmap_add_many, METH_VARARGS, "Add values from iterable or array.array into bit map"},
+    {"has_many", (PyCFunction)bitmap_has_many, METH_VARARGS, "Return list of bool for values from iterable or array.array"},
+    {"count", (PyCFunction)bitmap_count, METH_NOARGS, "Count of values in bit map"},
+    {"to_bytes", (PyCFunction)bitmap_to_bytes, METH_NOARGS, "Dump words of bit map to bytes"},
+    {"load", (PyCFunction)bitmap_load, METH_VARARGS, "Load words of bit map from bytes"},
+    {"next_set", (PyCFunction)bitmap_next_set, METH_VARARGS, "First value in bit map not less than start, None if not found"},
+    {"next_clear", (PyCFunction)bitmap_next_clear, METH_VARARGS, "First value not in bit map and not less than start, None if not found"},
+    {"prev_set", (PyCFunction)bitmap_prev_set, METH_VARARGS, "Last value in bit map not greater than start, None if not found"},
     {NULL, NULL},  /* sentinel */
 };
 
@@ -167,7 +692,7 @@ static PyTypeObject _bitMap_Type = {
     0,                         /*tp_setattr*/
     0,                         /*tp_compare*/
     0,                         /*tp_repr*/
-    0,                         /*tp_as_number*/
+    &bitMapAsNumber,           /*tp_as_number*/
     0,                         /*tp_as_sequence*/
     0,                         /*tp_as_mapping*/
     0,                         /*tp_hash */
@@ -176,7 +701,7 @@ static PyTypeObject _bitMap_Type = {
     0,                         /*tp_getattro*/
     0,                         /*tp_setattro*/
     0,                         /*tp_as_buffer*/
-    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE ,        /*tp_flags*/
+    Py_TPFLAGS_DEFAULT | Py_TPFLAGS_BASETYPE | Py_TPFLAGS_CHECKTYPES,        /*tp_flags*/
     "C bitMap objects",           /*tp_doc*/
     0,                         /* tp_traverse */
     0,                         /* tp_clear */
@@ -207,8 +732,49 @@ static PyObject *Cmonotonic(PyObject *self, PyObject *args) {
 }
 
 
+#ifdef __linux__
+static PyObject *Cinotify_events(PyObject *self, PyObject *args) {
+    Py_buffer view;
+    int length;
+    Py_ssize_t offset = 0;
+    Py_ssize_t size = sizeof(struct inotify_event);
+    PyObject *events;
+    PyObject *item;
+    struct inotify_event *ievent;
+
+    if (!PyArg_ParseTuple(args, "s*i", &view, &length)) return NULL;
+    if (length < 0 || length > view.len) {
+        PyBuffer_Release(&view);
+        PyErr_SetString(PyExc_ValueError, "length over buffer size");
+        return NULL;
+    }
+    events = PyList_New(0);
+    while (events != NULL && offset + size <= length) {
+        ievent = (struct inotify_event *)((char *)view.buf + offset);
+        if (offset + size + ievent->len > length) break;
+        /* name is padded with null */
+        item = Py_BuildValue("(iIIs#)", ievent->wd, ievent->mask, ievent->cookie, ievent->name,
+                             ievent->len ? (int)strnlen(ievent->name, ievent->len) : 0);
+        if (item == NULL || PyList_Append(events, item) < 0) {
+            Py_XDECREF(item);
+            Py_DECREF(events);
+            events = NULL;
+            break;
+        }
+        Py_DECREF(item);
+        offset += size + ievent->len;
+    }
+    PyBuffer_Release(&view);
+    return events;
+}
+#endif
+
+
 static PyMethodDef CutilsFunctions[] = {
     {"monotonic", (PyCFunction)Cmonotonic, METH_NOARGS, "Get millisecond with options CLOCK_MONOTONIC"},
+#ifdef __linux__
+    {"inotify_events", (PyCFunction)Cinotify_events, METH_VARARGS, "Parse inotify events in buffer to list of (wd, mask, cookie, name)"},
+#endif
     {NULL, NULL},  /* sentinel */
 };
 
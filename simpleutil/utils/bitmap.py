@@ -1,3 +1,69 @@
+import os
+import sys
+import mmap
+import array
+import bisect
+import struct
+
+# bytes of BitMap start with header, words follow header in native
+# byte order, header padded to 64 bytes so words are aligned in mmap
+_BITMAP_HEADER = struct.Struct('<4sQI')
+_BITMAP_MAGIC = 'BMP1'
+_BITMAP_OFFSET = 64
+
+
+def _word_size(max):
+    return 64 if max >= (1 << 32) else 32
+
+
+def _words_bytes(max):
+    size = _word_size(max)
+    return (int(max / size) + 1) * (size / 8)
+
+
+def _pack_header(max):
+    return _BITMAP_HEADER.pack(_BITMAP_MAGIC, max,
+                               _word_size(max)).ljust(_BITMAP_OFFSET, '\0')
+
+
+def _unpack_header(buf):
+    if len(buf) < _BITMAP_OFFSET:
+        raise ValueError('Bit map bytes length error')
+    magic, max, size = _BITMAP_HEADER.unpack_from(buf, 0)
+    if magic != _BITMAP_MAGIC or size != _word_size(max):
+        raise ValueError('Bit map bytes header error')
+    if len(buf) != _BITMAP_OFFSET + _words_bytes(max):
+        raise ValueError('Bit map bytes length error')
+    return max
+
+
+def _open_map(path, max=None):
+    """Open or create bit map file, return mmap and max of bit map"""
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, 'r+b') as f:
+            length = os.fstat(f.fileno()).st_size
+            mm = mmap.mmap(f.fileno(), length)
+        try:
+            _max = _unpack_header(mm)
+        except ValueError:
+            mm.close()
+            raise
+        if max is not None and max != _max:
+            mm.close()
+            raise ValueError('Bit map file max value not match')
+        return mm, _max
+    if max is None:
+        raise ValueError('Bit map file not exist and max is None')
+    if max <= 0 or max >= 1 << 64:
+        raise ValueError('Bit map init value error')
+    with open(path, 'w+b') as f:
+        f.write(_pack_header(max))
+        f.truncate(_BITMAP_OFFSET + _words_bytes(max))
+        f.flush()
+        mm = mmap.mmap(f.fileno(), _BITMAP_OFFSET + _words_bytes(max))
+    return mm, max
+
+
 try:
     from simpleutil.utils import _cutils
 
@@ -23,22 +89,59 @@ try:
             return self.big2small() if reverse else self.small2big()
 
         def big2small(self):
-            length = int(self.max / self.size) + 1
-            for index in xrange(length - 1, -1, -1):
-                bitmap = self.get(index)
-                for i in range(self.size - 1, -1, -1):
-                    if (1 << i) & bitmap:
-                        yield (index * self.size) + i
+            num = self.prev_set(self.max)
+            while num is not None:
+                yield num
+                if num == 0:
+                    break
+                num = self.prev_set(num - 1)
 
         def small2big(self):
-            length = int(self.max / self.size) + 1
-            for index in xrange(length):
-                bitmap = self.get(index)
-                for i in range(0, self.size):
-                    if (1 << i) & bitmap:
-                        yield (index * self.size) + i
+            num = self.next_set(0)
+            while num is not None:
+                yield num
+                num = self.next_set(num + 1)
+
+        def copy(self):
+            bitmap = BitMap(self.max)
+            bitmap.load(_cutils.bitMap.to_bytes(self))
+            return bitmap
+
+        def to_bytes(self):
+            return _pack_header(self.max) + _cutils.bitMap.to_bytes(self)
+
+        @staticmethod
+        def from_bytes(buf):
+            bitmap = BitMap(_unpack_header(buf))
+            bitmap.load(buffer(buf, _BITMAP_OFFSET))
+            return bitmap
+
+    def _attach(bitmap, max, mm):
+        _cutils.bitMap.__init__(bitmap, max, mm, _BITMAP_OFFSET)
+
 except ImportError:
 
+    class _MmapWords(object):
+        """Words of native bit map in mmap"""
+
+        def __init__(self, mm, size, length):
+            self.mm = mm
+            self.word = struct.Struct('=Q' if size == 64 else '=I')
+            self.length = length
+
+        def __len__(self):
+            return self.length
+
+        def __getitem__(self, index):
+            if index < 0 or index >= self.length:
+                raise IndexError('word index out of range')
+            return self.word.unpack_from(self.mm, _BITMAP_OFFSET + index * self.word.size)[0]
+
+        def __setitem__(self, index, value):
+            if index < 0 or index >= self.length:
+                raise IndexError('word index out of range')
+            self.word.pack_into(self.mm, _BITMAP_OFFSET + index * self.word.size, value)
+
     class BitMap(object):
         """Bit map native"""
 
@@ -59,18 +162,486 @@ except ImportError:
                 raise ValueError('Value over range')
             return (self.array[num / self.size] & (1 << (num % self.size)) > 0)
 
+        def remove(self, num):
+            if num < 0 or num > self.max:
+                raise ValueError('Value over range')
+            self.array[num / self.size] &= ~(1 << (num % self.size))
+
+        def add_many(self, nums):
+            for num in nums:
+                self.add(num)
+
+        def has_many(self, nums):
+            return [self.has(num) for num in nums]
+
+        def count(self):
+            return sum(bin(bitmap).count('1') for bitmap in self.array)
+
+        def _algebra(self, other, func):
+            if not isinstance(other, BitMap):
+                return NotImplemented
+            if other.max != self.max:
+                raise ValueError('bit map max value not match')
+            bitmap = self.__class__(self.max)
+            bitmap.array = map(func, self.array, other.array)
+            return bitmap
+
+        def __or__(self, other):
+            return self._algebra(other, lambda x, y: x | y)
+
+        def __and__(self, other):
+            return self._algebra(other, lambda x, y: x & y)
+
+        def __xor__(self, other):
+            return self._algebra(other, lambda x, y: x ^ y)
+
+        def __sub__(self, other):
+            return self._algebra(other, lambda x, y: x & ~y)
+
+        def _ialgebra(self, other, func):
+            # write into self.array, words of MmapBitMap changed in place
+            if not isinstance(other, BitMap):
+                return NotImplemented
+            if other.max != self.max:
+                raise ValueError('bit map max value not match')
+            array = self.array
+            for index, bitmap in enumerate(other.array):
+                array[index] = func(array[index], bitmap)
+            return self
+
+        def __ior__(self, other):
+            return self._ialgebra(other, lambda x, y: x | y)
+
+        def __iand__(self, other):
+            return self._ialgebra(other, lambda x, y: x & y)
+
+        def __ixor__(self, other):
+            return self._ialgebra(other, lambda x, y: x ^ y)
+
+        def __isub__(self, other):
+            return self._ialgebra(other, lambda x, y: x & ~y)
+
         def all(self, reverse=False):
             return self.big2small() if reverse else self.small2big()
 
         def big2small(self):
             for index in xrange(len(self.array) - 1, -1, -1):
                 bitmap = self.array[index]
-                for i in range(self.size - 1, -1, -1):
-                    if (1 << i) & bitmap:
-                        yield (index * self.size) + i
+                while bitmap:
+                    i = bitmap.bit_length() - 1
+                    yield (index * self.size) + i
+                    bitmap ^= 1 << i
 
         def small2big(self):
             for index, bitmap in enumerate(self.array):
-                for i in range(0, self.size):
-                    if (1 << i) & bitmap:
-                        yield (index * self.size) + i
+                while bitmap:
+                    lowest = bitmap & -bitmap
+                    yield (index * self.size) + lowest.bit_length() - 1
+                    bitmap ^= lowest
+
+        def _scan(self, start, invert):
+            if start < 0:
+                raise ValueError('Value over range')
+            if start > self.max:
+                return None
+            full = (1 << self.size) - 1
+            index = start / self.size
+            bitmap = self.array[index]
+            if invert:
+                bitmap ^= full
+            bitmap &= full ^ ((1 << (start % self.size)) - 1)
+            while True:
+                if bitmap:
+                    num = index * self.size + (bitmap & -bitmap).bit_length() - 1
+                    return num if num <= self.max else None
+                index += 1
+                if index >= len(self.array):
+                    return None
+                bitmap = self.array[index]
+                if invert:
+                    bitmap ^= full
+
+        def next_set(self, start):
+            return self._scan(start, False)
+
+        def next_clear(self, start):
+            return self._scan(start, True)
+
+        def prev_set(self, start):
+            if start < 0:
+                raise ValueError('Value over range')
+            start = min(start, self.max)
+            index = start / self.size
+            bitmap = self.array[index] & ((1 << (start % self.size + 1)) - 1)
+            while True:
+                if bitmap:
+                    return index * self.size + bitmap.bit_length() - 1
+                if index == 0:
+                    return None
+                index -= 1
+                bitmap = self.array[index]
+
+        def copy(self):
+            bitmap = BitMap(self.max)
+            bitmap.array = list(self.array)
+            return bitmap
+
+        def to_bytes(self):
+            word = struct.Struct('=Q' if self.size == 64 else '=I')
+            return _pack_header(self.max) + ''.join(word.pack(bitmap) for bitmap in self.array)
+
+        @staticmethod
+        def from_bytes(buf):
+            bitmap = BitMap(_unpack_header(buf))
+            word = struct.Struct('=Q' if bitmap.size == 64 else '=I')
+            bitmap.array = [word.unpack_from(buf, offset)[0] for offset in
+                            xrange(_BITMAP_OFFSET, len(buf), word.size)]
+            return bitmap
+
+    def _attach(bitmap, max, mm):
+        bitmap.max = max
+        bitmap.size = _word_size(max)
+        bitmap.array = _MmapWords(mm, bitmap.size, int(max / bitmap.size) + 1)
+
+
+class MmapBitMap(BitMap):
+    """Bit map keep words in a file by mmap
+
+    The file is created with max when not exist, an existing file is
+    opened with the max in it, so an allocation map can be reopened
+    without rebuilding. Call flush to write changes to disk, the file
+    is unmapped when bit map released.
+    Result of | & ^ - is a BitMap in memory, |= &= ^= -= change the file.
+    """
+
+    def __init__(self, path, max=None):
+        self.path = path
+        self._mmap, max = _open_map(path, max)
+        _attach(self, max, self._mmap)
+
+    def flush(self):
+        self._mmap.flush()
+
+    def __or__(self, other):
+        return self.copy() | other
+
+    def __and__(self, other):
+        return self.copy() & other
+
+    def __xor__(self, other):
+        return self.copy() ^ other
+
+    def __sub__(self, other):
+        return self.copy() - other
+
+    def to_bytes(self):
+        return self._mmap[:]
+
+
+# containers of CompressedBitMap, each one keep low 16 bits of values
+# in a 64K chunk
+ARRAY = 0
+BITSET = 1
+RUN = 2
+
+# array container convert to bitset over this size
+ARRAY_MAX_SIZE = 4096
+BITSET_BYTES = 8192
+
+_HEADER = struct.Struct('<4sQI')
+_CONTAINER = struct.Struct('<QBI')
+_MAGIC = 'CBM1'
+
+
+def _native_bytes(values):
+    """array.array to little endian bytes"""
+    if sys.byteorder != 'little':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tostring()
+
+
+def _from_bytes(typecode, buf):
+    values = array.array(typecode)
+    values.fromstring(buf)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+class _ArrayContainer(object):
+    """Sorted array of values, for sparse chunk"""
+
+    kind = ARRAY
+
+    __slots__ = ('values',)
+
+    def __init__(self, values=None):
+        self.values = values if values is not None else array.array('H')
+
+    def add(self, low):
+        values = self.values
+        index = bisect.bisect_left(values, low)
+        if index < len(values) and values[index] == low:
+            return self
+        if len(values) >= ARRAY_MAX_SIZE:
+            container = _BitsetContainer.from_values(values)
+            return container.add(low)
+        values.insert(index, low)
+        return self
+
+    def has(self, low):
+        values = self.values
+        index = bisect.bisect_left(values, low)
+        return index < len(values) and values[index] == low
+
+    def __len__(self):
+        return len(self.values)
+
+    def iter(self, reverse=False):
+        return reversed(self.values) if reverse else iter(self.values)
+
+    def nbytes(self):
+        return 2 * len(self.values)
+
+    def dumps(self):
+        return len(self.values), _native_bytes(self.values)
+
+    @classmethod
+    def loads(cls, count, buf):
+        return cls(_from_bytes('H', buf[:2 * count])), 2 * count
+
+
+class _BitsetContainer(object):
+    """Bit set of 65536 bits, for dense chunk"""
+
+    kind = BITSET
+
+    __slots__ = ('bits', 'count')
+
+    def __init__(self, bits=None, count=0):
+        self.bits = bits if bits is not None else bytearray(BITSET_BYTES)
+        self.count = count
+
+    @classmethod
+    def from_values(cls, values):
+        container = cls()
+        for low in values:
+            container.add(low)
+        return container
+
+    def add(self, low):
+        index = low >> 3
+        bit = 1 << (low & 7)
+        if not self.bits[index] & bit:
+            self.bits[index] |= bit
+            self.count += 1
+        return self
+
+    def has(self, low):
+        return bool(self.bits[low >> 3] & (1 << (low & 7)))
+
+    def __len__(self):
+        return self.count
+
+    def iter(self, reverse=False):
+        bits = self.bits
+        indexes = xrange(BITSET_BYTES - 1, -1, -1) if reverse else xrange(BITSET_BYTES)
+        offsets = range(7, -1, -1) if reverse else range(8)
+        for index in indexes:
+            byte = bits[index]
+            if not byte:
+                continue
+            for offset in offsets:
+                if byte & (1 << offset):
+                    yield (index << 3) + offset
+
+    def nbytes(self):
+        return BITSET_BYTES
+
+    def dumps(self):
+        return self.count, str(self.bits)
+
+    @classmethod
+    def loads(cls, count, buf):
+        return cls(bytearray(buf[:BITSET_BYTES]), count), BITSET_BYTES
+
+
+class _RunContainer(object):
+    """Sorted runs of continuous values, run is start and end both included"""
+
+    kind = RUN
+
+    __slots__ = ('starts', 'ends', 'count')
+
+    def __init__(self, starts=None, ends=None):
+        self.starts = starts if starts is not None else array.array('H')
+        self.ends = ends if ends is not None else array.array('H')
+        self.count = sum(end - start + 1 for start, end in zip(self.starts, self.ends))
+
+    @classmethod
+    def from_values(cls, values):
+        starts = array.array('H')
+        ends = array.array('H')
+        for low in values:
+            if ends and ends[-1] + 1 == low:
+                ends[-1] = low
+            else:
+                starts.append(low)
+                ends.append(low)
+        return cls(starts, ends)
+
+    def add(self, low):
+        starts = self.starts
+        ends = self.ends
+        index = bisect.bisect_right(starts, low) - 1
+        if index >= 0 and low <= ends[index]:
+            return self
+        self.count += 1
+        # join previous run
+        if index >= 0 and ends[index] + 1 == low:
+            ends[index] = low
+            # join next run too
+            if index + 1 < len(starts) and starts[index + 1] == low + 1:
+                ends[index] = ends[index + 1]
+                del starts[index + 1]
+                del ends[index + 1]
+        # join next run
+        elif index + 1 < len(starts) and starts[index + 1] == low + 1:
+            starts[index + 1] = low
+        else:
+            starts.insert(index + 1, low)
+            ends.insert(index + 1, low)
+        return self
+
+    def has(self, low):
+        index = bisect.bisect_right(self.starts, low) - 1
+        return index >= 0 and low <= self.ends[index]
+
+    def __len__(self):
+        return self.count
+
+    def iter(self, reverse=False):
+        if reverse:
+            for index in xrange(len(self.starts) - 1, -1, -1):
+                for low in xrange(self.ends[index], self.starts[index] - 1, -1):
+                    yield low
+        else:
+            for start, end in zip(self.starts, self.ends):
+                for low in xrange(start, end + 1):
+                    yield low
+
+    def nbytes(self):
+        return 4 * len(self.starts)
+
+    def dumps(self):
+        return len(self.starts), _native_bytes(self.starts) + _native_bytes(self.ends)
+
+    @classmethod
+    def loads(cls, count, buf):
+        starts = _from_bytes('H', buf[:2 * count])
+        ends = _from_bytes('H', buf[2 * count:4 * count])
+        return cls(starts, ends), 4 * count
+
+
+_CONTAINERS = {ARRAY: _ArrayContainer,
+               BITSET: _BitsetContainer,
+               RUN: _RunContainer}
+
+
+class CompressedBitMap(object):
+    """Compressed bit map like roaring bitmap
+
+    Values are grouped by high bits into 64K chunks, a chunk keep low
+    16 bits in a sorted array when sparse, a bit set when dense,
+    or runs after optimize when values are continuous.
+    Memory is used by set values only, not by max.
+    """
+
+    def __init__(self, max):
+        if max <= 0 or max >= 1 << 64:
+            raise ValueError('Bit map init value error')
+        self.max = max
+        self._keys = []
+        self._containers = {}
+
+    def add(self, num):
+        if num < 0 or num > self.max:
+            raise ValueError('Value over range')
+        key = num >> 16
+        try:
+            container = self._containers[key]
+        except KeyError:
+            container = _ArrayContainer()
+            bisect.insort(self._keys, key)
+        self._containers[key] = container.add(num & 0xffff)
+
+    def has(self, num):
+        if num < 0 or num > self.max:
+            raise ValueError('Value over range')
+        try:
+            container = self._containers[num >> 16]
+        except KeyError:
+            return False
+        return container.has(num & 0xffff)
+
+    def add_many(self, nums):
+        for num in nums:
+            self.add(num)
+
+    def has_many(self, nums):
+        return [self.has(num) for num in nums]
+
+    def count(self):
+        return sum(len(container) for container in self._containers.itervalues())
+
+    def nbytes(self):
+        """Bytes used by containers"""
+        return sum(container.nbytes() for container in self._containers.itervalues())
+
+    def all(self, reverse=False):
+        keys = reversed(self._keys) if reverse else self._keys
+        for key in keys:
+            high = key << 16
+            for low in self._containers[key].iter(reverse):
+                yield high | low
+
+    def optimize(self):
+        """Convert every container to the type use least memory"""
+        for key, container in self._containers.items():
+            values = list(container.iter())
+            candidates = [_RunContainer.from_values(values)]
+            if len(values) <= ARRAY_MAX_SIZE:
+                candidates.append(_ArrayContainer(array.array('H', values)))
+            else:
+                candidates.append(_BitsetContainer.from_values(values))
+            self._containers[key] = min(candidates, key=lambda c: c.nbytes())
+
+    def to_bytes(self):
+        buffers = [_HEADER.pack(_MAGIC, self.max, len(self._keys))]
+        for key in self._keys:
+            container = self._containers[key]
+            count, buf = container.dumps()
+            buffers.append(_CONTAINER.pack(key, container.kind, count))
+            buffers.append(buf)
+        return ''.join(buffers)
+
+    @classmethod
+    def from_bytes(cls, buf):
+        magic, max, length = _HEADER.unpack_from(buf, 0)
+        if magic != _MAGIC:
+            raise ValueError('Compressed bit map bytes magic error')
+        bitmap = cls(max)
+        offset = _HEADER.size
+        for _ in xrange(length):
+            key, kind, count = _CONTAINER.unpack_from(buf, offset)
+            offset += _CONTAINER.size
+            try:
+                container_cls = _CONTAINERS[kind]
+            except KeyError:
+                raise ValueError('Compressed bit map container type error')
+            container, size = container_cls.loads(count, buffer(buf, offset))
+            offset += size
+            bitmap._keys.append(key)
+            bitmap._containers[key] = container
+        return bitmap
@@ -1,7 +1,27 @@
 from __future__ import absolute_import
 
+import os
+import sys
+import six
+import mmap
+import time
+import zlib
+import struct
+import random
+import weakref
+import tempfile
+import contextlib
 import collections
+import eventlet
+from eventlet import event
 from simpleutil.utils import timeutils
+from simpleutil.utils import lockutils
+from six.moves import cPickle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 from abc import abstractmethod
 
@@ -50,6 +70,41 @@ DefaultMapping.register(dict)
 
 
 
+# all live caches, key is id of cache
+_caches = weakref.WeakValueDictionary()
+
+
+CacheStatsInfo = collections.namedtuple('CacheStatsInfo',
+                                        ['name', 'hits', 'misses',
+                                         'evictions', 'expirations',
+                                         'currsize', 'maxsize', 'nbytes'])
+
+
+class CacheStats(object):
+    """Counters of a cache, enabled by Cache.enable_stats"""
+
+    def __init__(self, name):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def clear(self):
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+
+def caches():
+    """Return all live caches."""
+    return list(_caches.values())
+
+
+def cache_stats():
+    """Return stats info of all live caches which stats is enabled."""
+    return [cache.stats_info() for cache in caches()
+            if cache.stats is not None]
+
+
 class _DefaultSize(object):
     def __getitem__(self, _):
         return 1
@@ -65,6 +120,8 @@ class Cache(DefaultMapping):
     """Mutable mapping to serve as a simple cache or cache base class."""
 
     __size = _DefaultSize()
+    __stats = None
+    __evictions = 0
 
     def __init__(self, maxsize, missing=None, getsizeof=None):
         if missing:
@@ -75,6 +132,7 @@ class Cache(DefaultMapping):
         self.__data = dict()
         self.__currsize = 0
         self.__maxsize = maxsize
+        _caches[id(self)] = self
 
     def __repr__(self):
         return '%s(%r, maxsize=%r, currsize=%r)' % (
@@ -86,9 +144,12 @@ class Cache(DefaultMapping):
 
     def __getitem__(self, key):
         try:
-            return self.__data[key]
+            value = self.__data[key]
         except KeyError:
             return self.__missing__(key)
+        if self.__stats is not None:
+            self.__stats.hits += 1
+        return value
 
     def __setitem__(self, key, value):
         maxsize = self.__maxsize
@@ -96,8 +157,17 @@ class Cache(DefaultMapping):
         if size > maxsize:
             raise ValueError('value too large')
         if key not in self.__data or self.__size[key] < size:
+            stats = self.__stats
+            if stats is not None:
+                # popitem read item by __getitem__, that is not a hit
+                hits = stats.hits
             while self.__currsize + size > maxsize:
                 self.popitem()
+                self.__evictions += 1
+                if stats is not None:
+                    stats.evictions += 1
+            if stats is not None:
+                stats.hits = hits
         if key in self.__data:
             diffsize = size - self.__size[key]
         else:
@@ -115,6 +185,8 @@ class Cache(DefaultMapping):
         return key in self.__data
 
     def __missing__(self, key):
+        if self.__stats is not None:
+            self.__stats.misses += 1
         value = self.__missing(key)
         try:
             self.__setitem__(key, value)
@@ -125,6 +197,10 @@ class Cache(DefaultMapping):
     def __iter__(self):
         return iter(self.__data)
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        _caches[id(self)] = self
+
     def __len__(self):
         return len(self.__data)
 
@@ -150,6 +226,279 @@ class Cache(DefaultMapping):
         """Return the size of a cache element's value."""
         return self.__getsizeof(value)
 
+    @property
+    def evictions(self):
+        """Count of items evicted to make room since the cache created."""
+        return self.__evictions
+
+    @property
+    def stats(self):
+        """The CacheStats of the cache, None when stats is not enabled."""
+        return self.__stats
+
+    def enable_stats(self, name=None):
+        """Count hits, misses, evictions and expirations of the cache."""
+        if self.__stats is None:
+            self.__stats = CacheStats(name or '%s-%x' % (self.__class__.__name__,
+                                                         id(self)))
+        return self.__stats
+
+    def disable_stats(self):
+        self.__stats = None
+
+    def stats_info(self):
+        """Return a CacheStatsInfo snapshot of the cache.
+
+        nbytes is a rough footprint of keys and values by sys.getsizeof,
+        it walk all items, do not call it too often on a big cache.
+        """
+        stats = self.__stats
+        if stats is None:
+            raise RuntimeError('Stats of cache not enabled')
+        nbytes = 0
+        for key, value in list(self.__data.items()):
+            nbytes += sys.getsizeof(key) + sys.getsizeof(value)
+        return CacheStatsInfo(stats.name, stats.hits, stats.misses,
+                              stats.evictions, stats.expirations,
+                              self.currsize, self.maxsize, nbytes)
+
+
+class _LRULink(object):
+
+    __slots__ = ('key', 'next', 'prev')
+
+    def __init__(self, key=None):
+        self.key = key
+
+    def __reduce__(self):
+        return _LRULink, (self.key,)
+
+    def unlink(self):
+        next = self.next
+        prev = self.prev
+        prev.next = next
+        next.prev = prev
+
+
+class LRUCache(Cache):
+    """Least Recently Used (LRU) cache implementation."""
+
+    def __init__(self, maxsize, missing=None, getsizeof=None):
+        Cache.__init__(self, maxsize, missing, getsizeof)
+        self.__root = root = _LRULink()
+        root.prev = root.next = root
+        self.__links = {}
+
+    def __getitem__(self, key, cache_getitem=Cache.__getitem__):
+        value = cache_getitem(self, key)
+        try:
+            link = self.__links[key]
+        except KeyError:
+            pass  # value from missing too large
+        else:
+            link.unlink()
+            self.__append(link)
+        return value
+
+    def __setitem__(self, key, value, cache_setitem=Cache.__setitem__):
+        cache_setitem(self, key, value)
+        try:
+            link = self.__links[key]
+        except KeyError:
+            self.__links[key] = link = _LRULink(key)
+        else:
+            link.unlink()
+        self.__append(link)
+
+    def __delitem__(self, key, cache_delitem=Cache.__delitem__):
+        cache_delitem(self, key)
+        link = self.__links.pop(key)
+        link.unlink()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        root = self.__root
+        order = state['_LRUCache__order'] = []
+        curr = root.next
+        while curr is not root:
+            order.append(curr.key)
+            curr = curr.next
+        return state
+
+    def __setstate__(self, state):
+        order = state.pop('_LRUCache__order')
+        Cache.__setstate__(self, state)
+        root = self.__root
+        root.prev = root.next = root
+        links = self.__links
+        for key in order:
+            self.__append(links[key])
+
+    def __append(self, link):
+        link.next = root = self.__root
+        link.prev = prev = root.prev
+        prev.next = root.prev = link
+
+    def popitem(self):
+        """Remove and return the `(key, value)` pair least recently used."""
+        link = self.__root.next
+        if link is self.__root:
+            raise KeyError('%s is empty' % self.__class__.__name__)
+        key = link.key
+        return (key, self.pop(key))
+
+
+class _LFUBucket(object):
+
+    __slots__ = ('count', 'keys', 'next', 'prev')
+
+    def __init__(self, count=0):
+        self.count = count
+        # insertion order, oldest key first
+        self.keys = collections.OrderedDict()
+
+    def __reduce__(self):
+        return _LFUBucket, (self.count,)
+
+    def unlink(self):
+        next = self.next
+        prev = self.prev
+        prev.next = next
+        next.prev = prev
+
+    def insert_after(self, prev):
+        self.prev = prev
+        self.next = next = prev.next
+        prev.next = next.prev = self
+
+
+class LFUCache(Cache):
+    """Least Frequently Used (LFU) cache implementation.
+
+    Keys with the same use count live in one bucket, buckets are linked
+    in ascending count order, so get, set and evict are all O(1).
+    Between keys with the same count the oldest one is evicted first.
+    """
+
+    def __init__(self, maxsize, missing=None, getsizeof=None):
+        Cache.__init__(self, maxsize, missing, getsizeof)
+        self.__root = root = _LFUBucket()
+        root.prev = root.next = root
+        self.__buckets = {}
+
+    def __getitem__(self, key, cache_getitem=Cache.__getitem__):
+        hit = key in self.__buckets
+        value = cache_getitem(self, key)
+        if hit:
+            self.__touch(key)
+        return value
+
+    def __setitem__(self, key, value, cache_setitem=Cache.__setitem__):
+        cache_setitem(self, key, value)
+        if key in self.__buckets:
+            self.__touch(key)
+        else:
+            root = self.__root
+            bucket = root.next
+            if bucket is root or bucket.count != 1:
+                bucket = _LFUBucket(1)
+                bucket.insert_after(root)
+            bucket.keys[key] = None
+            self.__buckets[key] = bucket
+
+    def __delitem__(self, key, cache_delitem=Cache.__delitem__):
+        cache_delitem(self, key)
+        bucket = self.__buckets.pop(key)
+        del bucket.keys[key]
+        if not bucket.keys:
+            bucket.unlink()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        root = self.__root
+        order = state['_LFUCache__order'] = []
+        curr = root.next
+        while curr is not root:
+            order.append((curr.count, list(curr.keys)))
+            curr = curr.next
+        return state
+
+    def __setstate__(self, state):
+        order = state.pop('_LFUCache__order')
+        Cache.__setstate__(self, state)
+        root = self.__root
+        root.prev = root.next = root
+        buckets = self.__buckets
+        for count, keys in order:
+            bucket = _LFUBucket(count)
+            bucket.insert_after(root.prev)
+            for key in keys:
+                bucket.keys[key] = None
+                buckets[key] = bucket
+
+    def __touch(self, key):
+        bucket = self.__buckets[key]
+        count = bucket.count + 1
+        next = bucket.next
+        if next is self.__root or next.count != count:
+            next = _LFUBucket(count)
+            next.insert_after(bucket)
+        del bucket.keys[key]
+        next.keys[key] = None
+        self.__buckets[key] = next
+        if not bucket.keys:
+            bucket.unlink()
+
+    def popitem(self):
+        """Remove and return the `(key, value)` pair least frequently used."""
+        bucket = self.__root.next
+        if bucket is self.__root:
+            raise KeyError('%s is empty' % self.__class__.__name__)
+        key = next(iter(bucket.keys))
+        return (key, self.pop(key))
+
+
+class RRCache(Cache):
+    """Random Replacement (RR) cache implementation.
+
+    Keys are kept in a list with a key to index map, removing a key
+    swaps the last one into its slot, so eviction stays O(1).
+    """
+
+    def __init__(self, maxsize, choice=random.choice, missing=None,
+                 getsizeof=None):
+        Cache.__init__(self, maxsize, missing, getsizeof)
+        self.__choice = choice
+        self.__keys = []
+        self.__index = {}
+
+    def __setitem__(self, key, value, cache_setitem=Cache.__setitem__):
+        cache_setitem(self, key, value)
+        if key not in self.__index:
+            self.__index[key] = len(self.__keys)
+            self.__keys.append(key)
+
+    def __delitem__(self, key, cache_delitem=Cache.__delitem__):
+        cache_delitem(self, key)
+        keys = self.__keys
+        index = self.__index.pop(key)
+        last = keys.pop()
+        if index < len(keys):
+            keys[index] = last
+            self.__index[last] = index
+
+    @property
+    def choice(self):
+        """The `choice` function used by the cache."""
+        return self.__choice
+
+    def popitem(self):
+        """Remove and return a random `(key, value)` pair."""
+        if not self.__keys:
+            raise KeyError('%s is empty' % self.__class__.__name__)
+        key = self.__choice(self.__keys)
+        return (key, self.pop(key))
+
 
 class _Link(object):
 
@@ -200,16 +549,43 @@ class _Timer(object):
 
 
 class TTLCache(Cache):
-    """LRU Cache implementation with per-item time-to-live (TTL) value."""
+    """LRU Cache implementation with per-item time-to-live (TTL) value.
+
+    With `singleflight` set, concurrent misses of one key call `missing`
+    only once, other greenthreads wait for the result of the first one.
+
+    With `hard_ttl` set, an item older than `ttl` is still returned and
+    `missing` is called in background to refresh it, the item is dropped
+    after `hard_ttl`. The refresh run by `executor`, a `ThreadGroup` or
+    `GreenThreadPoolExecutor`, use eventlet.spawn_n when it is None.
+
+    Items share one ttl, so the expire link list is always sorted by
+    expire time. With `expire_step` set, each write removes at most
+    `expire_step` expired items instead of all of them, expired items
+    left in the cache are invisible and removed by later writes.
+    """
 
     def __init__(self, maxsize, ttl, timer=timeutils.monotonic, missing=None,
-                 getsizeof=None):
+                 getsizeof=None, singleflight=False, hard_ttl=None,
+                 executor=None, expire_step=None):
+        if hard_ttl is not None:
+            if hard_ttl < ttl:
+                raise ValueError('hard ttl less then ttl')
+            if not missing:
+                raise ValueError('hard ttl need missing to refresh item')
         Cache.__init__(self, maxsize, missing, getsizeof)
         self.__root = root = _Link()
         root.prev = root.next = root
         self.__links = collections.OrderedDict()
         self.__timer = _Timer(timer)
         self.__ttl = ttl
+        self.__flights = {} if singleflight else None
+        # link.expire is the hard expire time, item is stale after
+        # link.expire - grace
+        self.__grace = hard_ttl - ttl if hard_ttl is not None else 0
+        self.__refreshing = set()
+        self.__executor = executor
+        self.__step = expire_step
 
     def __contains__(self, key):
         try:
@@ -225,15 +601,72 @@ class TTLCache(Cache):
         except KeyError:
             expired = False
         else:
-            expired = link.expire < self.__timer()
+            time = self.__timer()
+            expired = link.expire < time
+            if (self.__grace and not expired and
+                    link.expire - self.__grace < time):
+                self.__revalidate(key)
         if expired:
             return self.__missing__(key)
         else:
             return cache_getitem(self, key)
 
+    def __missing__(self, key, cache_missing=Cache.__missing__):
+        flights = self.__flights
+        if flights is None:
+            return cache_missing(self, key)
+        try:
+            waiter = flights[key]
+        except KeyError:
+            pass
+        else:
+            if self.stats is not None:
+                self.stats.misses += 1
+            return waiter.wait()
+        flights[key] = waiter = event.Event()
+        try:
+            value = cache_missing(self, key)
+        except BaseException:
+            # eventlet.Timeout and GreenletExit also wake up waiters
+            exc_info = sys.exc_info()
+            waiter.send_exception(*exc_info)
+            six.reraise(*exc_info)
+        else:
+            waiter.send(value)
+        finally:
+            del flights[key]
+        return value
+
+    def __revalidate(self, key):
+        refreshing = self.__refreshing
+        if key in refreshing:
+            return
+        refreshing.add(key)
+        executor = self.__executor
+        if executor is None:
+            eventlet.spawn_n(self.__refresh, key)
+        elif hasattr(executor, 'submit'):
+            executor.submit(self.__refresh, key)
+        else:
+            executor.add_thread_n(self.__refresh, key)
+
+    def __refresh(self, key):
+        try:
+            # deleted or evicted before refresh run
+            if key not in self.__links:
+                return
+            value = self._Cache__missing(key)
+            # deleted or evicted while loading, drop the value
+            if key in self.__links:
+                self.__setitem__(key, value)
+        except Exception:
+            pass  # keep stale item until hard ttl, or value too large
+        finally:
+            self.__refreshing.discard(key)
+
     def __setitem__(self, key, value, cache_setitem=Cache.__setitem__):
         with self.__timer as time:
-            self.expire(time)
+            self.expire(time, self.__step)
             cache_setitem(self, key, value)
         try:
             link = self.__getlink(key)
@@ -241,7 +674,7 @@ class TTLCache(Cache):
             self.__links[key] = link = _Link(key)
         else:
             link.unlink()
-        link.expire = time + self.__ttl
+        link.expire = time + self.__ttl + self.__grace
         link.next = root = self.__root
         link.prev = prev = root.prev
         prev.next = root.prev = link
@@ -273,8 +706,16 @@ class TTLCache(Cache):
             curr = curr.next
         return count
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if state['_TTLCache__flights'] is not None:
+            state['_TTLCache__flights'] = {}
+        state['_TTLCache__refreshing'] = set()
+        state['_TTLCache__executor'] = None
+        return state
+
     def __setstate__(self, state):
-        self.__dict__.update(state)
+        Cache.__setstate__(self, state)
         root = self.__root
         root.prev = root.next = root
         for link in sorted(self.__links.values(), key=lambda obj: obj.expire):
@@ -304,20 +745,43 @@ class TTLCache(Cache):
         """The time-to-live value of the cache's items."""
         return self.__ttl
 
-    def expire(self, time=None):
-        """Remove expired items from the cache."""
+    @property
+    def hard_ttl(self):
+        """The time-to-live value of the cache's stale items."""
+        return self.__ttl + self.__grace
+
+    @property
+    def expire_step(self):
+        """The max count of expired items removed by one write."""
+        return self.__step
+
+    def expire(self, time=None, limit=None):
+        """Remove expired items from the cache.
+
+        Remove all expired items when `limit` is None.
+        """
         if time is None:
             time = self.__timer()
+        count = self.__expire(time, limit)
+        if count and self.stats is not None:
+            self.stats.expirations += count
+
+    def __expire(self, time, limit):
+        count = 0
         root = self.__root
         curr = root.next
         links = self.__links
         cache_delitem = Cache.__delitem__
         while curr is not root and curr.expire < time:
+            if limit is not None and count >= limit:
+                break
             cache_delitem(self, curr.key)
             del links[curr.key]
             next = curr.next
             curr.unlink()
             curr = next
+            count += 1
+        return count
 
     def clear(self):
         with self.__timer as time:
@@ -328,9 +792,15 @@ class TTLCache(Cache):
         with self.__timer:
             return Cache.get(self, *args, **kwargs)
 
-    def pop(self, *args, **kwargs):
+    def pop(self, key, *default):
         with self.__timer:
-            return Cache.pop(self, *args, **kwargs)
+            # read by Cache.__getitem__, a removed stale item
+            # should not be refreshed
+            if key in self:
+                value = Cache.__getitem__(self, key)
+                del self[key]
+                return value
+            return Cache.pop(self, key, *default)
 
     def setdefault(self, *args, **kwargs):
         with self.__timer:
@@ -340,9 +810,19 @@ class TTLCache(Cache):
         """Remove and return the `(key, value)` pair least recently used that
         has not already expired.
 
+        With `expire_step` set, an expired item left in the cache is removed
+        and returned first.
         """
         with self.__timer as time:
-            self.expire(time)
+            if self.__step is not None:
+                link = self.__root.next
+                if link is not self.__root and link.expire < time:
+                    key = link.key
+                    value = Cache.__getitem__(self, key)
+                    self.__expire(time, 1)
+                    return (key, value)
+            else:
+                self.expire(time)
             try:
                 key = next(iter(self.__links))
             except StopIteration:
@@ -360,3 +840,402 @@ class TTLCache(Cache):
             value = self.__links.pop(key)
             self.__links[key] = value
             return value
+
+
+class SharedCache(DefaultMapping):
+    """Cache in shared memory for processes forked from the creator.
+
+    Items are pickled into fixed size slots of a mmap'd hash table, each
+    bucket has `ways` slots and is locked by a fcntl record lock, so
+    forked workers can use one cache at the same time.
+    A full bucket evicts the slot least recently used.
+
+    `path` is the backing file, default is an unlinked temporary file
+    in /dev/shm. A file created by a SharedCache with the same layout
+    is reused, so cache stays warm when process restart.
+    Keys should be str, int or tuple of them, so the pickled key is stable.
+    `__len__` and `__iter__` scan the whole table.
+    """
+
+    HEADER = struct.Struct('<8sIII')
+    SLOT = struct.Struct('<BxxxIIIdd')
+    MAGIC = 'SHMCACHE'
+
+    EMPTY = 0
+    USED = 1
+
+    __evictions = 0
+
+    def __init__(self, maxsize, slotsize=256, ways=8, ttl=None, path=None,
+                 missing=None):
+        if fcntl is None:
+            raise NotImplementedError('Shared cache need fcntl')
+        if slotsize <= self.SLOT.size:
+            raise ValueError('slot size less then %d' % self.SLOT.size)
+        if missing:
+            self.__missing = missing
+        self.__ways = ways
+        self.__slotsize = slotsize
+        self.__buckets = (maxsize + ways - 1) // ways
+        self.__ttl = ttl
+        self.__blocksize = ways * slotsize
+        length = self.HEADER.size + self.__buckets * self.__blocksize
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix='shmcache-',
+                                        dir='/dev/shm' if os.path.isdir('/dev/shm') else None)
+            os.unlink(path)
+        else:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, self.HEADER.size, 0)
+            try:
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, length)
+                    os.write(fd, self.HEADER.pack(self.MAGIC, self.__buckets,
+                                                  ways, slotsize))
+                elif os.fstat(fd).st_size != length:
+                    raise ValueError('Shared cache file size not match')
+                self.__map = mmap.mmap(fd, length, mmap.MAP_SHARED,
+                                       mmap.PROT_READ | mmap.PROT_WRITE)
+                if self.HEADER.unpack_from(self.__map, 0) != \
+                        (self.MAGIC, self.__buckets, ways, slotsize):
+                    self.__map.close()
+                    raise ValueError('Shared cache file layout not match')
+            finally:
+                fcntl.lockf(fd, fcntl.LOCK_UN, self.HEADER.size, 0)
+        except Exception:
+            os.close(fd)
+            raise
+        self.__fd = fd
+
+    def __repr__(self):
+        return '%s(maxsize=%r, slotsize=%r, ways=%r)' % (
+            self.__class__.__name__,
+            self.maxsize,
+            self.__slotsize,
+            self.__ways,
+        )
+
+    @staticmethod
+    def __missing(key):
+        raise KeyError(key)
+
+    @contextlib.contextmanager
+    def __locked(self, bucket):
+        offset = self.HEADER.size + bucket * self.__blocksize
+        fcntl.lockf(self.__fd, fcntl.LOCK_EX, self.__blocksize, offset)
+        try:
+            yield offset
+        finally:
+            fcntl.lockf(self.__fd, fcntl.LOCK_UN, self.__blocksize, offset)
+
+    def __hash(self, key):
+        k = cPickle.dumps(key, 2)
+        h = zlib.crc32(k) & 0xffffffff
+        return k, h, h % self.__buckets
+
+    def __find(self, offset, k, h, now):
+        """Find slot of key, remove expired slot when found"""
+        m = self.__map
+        unpack = self.SLOT.unpack_from
+        for way in xrange(self.__ways):
+            slot = offset + way * self.__slotsize
+            state, _h, klen, vlen, atime, expire = unpack(m, slot)
+            if state != self.USED or _h != h or klen != len(k):
+                continue
+            start = slot + self.SLOT.size
+            if m[start:start + klen] != k:
+                continue
+            if expire and expire < now:
+                m[slot] = chr(self.EMPTY)
+                return None
+            return slot
+        return None
+
+    def __getitem__(self, key):
+        k, h, bucket = self.__hash(key)
+        now = time.time()
+        with self.__locked(bucket) as offset:
+            slot = self.__find(offset, k, h, now)
+            if slot is not None:
+                m = self.__map
+                state, h, klen, vlen, atime, expire = self.SLOT.unpack_from(m, slot)
+                self.SLOT.pack_into(m, slot, state, h, klen, vlen, now, expire)
+                start = slot + self.SLOT.size + klen
+                v = m[start:start + vlen]
+        if slot is None:
+            return self.__missing__(key)
+        return cPickle.loads(v)
+
+    def __missing__(self, key):
+        value = self.__missing(key)
+        try:
+            self.__setitem__(key, value)
+        except ValueError:
+            pass  # value too large
+        return value
+
+    def __setitem__(self, key, value):
+        k, h, bucket = self.__hash(key)
+        v = cPickle.dumps(value, 2)
+        if self.SLOT.size + len(k) + len(v) > self.__slotsize:
+            raise ValueError('value too large')
+        now = time.time()
+        expire = now + self.__ttl if self.__ttl else 0
+        m = self.__map
+        with self.__locked(bucket) as offset:
+            slot = self.__find(offset, k, h, now)
+            if slot is None:
+                oldest = None
+                for way in xrange(self.__ways):
+                    _slot = offset + way * self.__slotsize
+                    state, _, _, _, atime, _expire = self.SLOT.unpack_from(m, _slot)
+                    if state != self.USED or (_expire and _expire < now):
+                        slot = _slot
+                        break
+                    if oldest is None or atime < oldest:
+                        oldest = atime
+                        slot = _slot
+                else:
+                    self.__evictions += 1
+            # slot is empty while payload writing, header written last,
+            # a process killed in the middle leave no broken item
+            m[slot] = chr(self.EMPTY)
+            start = slot + self.SLOT.size
+            m[start:start + len(k) + len(v)] = k + v
+            self.SLOT.pack_into(m, slot, self.USED, h, len(k), len(v), now, expire)
+
+    def __delitem__(self, key):
+        k, h, bucket = self.__hash(key)
+        with self.__locked(bucket) as offset:
+            slot = self.__find(offset, k, h, time.time())
+            if slot is None:
+                raise KeyError(key)
+            self.__map[slot] = chr(self.EMPTY)
+
+    def __contains__(self, key):
+        k, h, bucket = self.__hash(key)
+        with self.__locked(bucket) as offset:
+            return self.__find(offset, k, h, time.time()) is not None
+
+    def __keys(self, bucket, now):
+        m = self.__map
+        keys = []
+        with self.__locked(bucket) as offset:
+            for way in xrange(self.__ways):
+                slot = offset + way * self.__slotsize
+                state, _, klen, _, _, expire = self.SLOT.unpack_from(m, slot)
+                if state == self.USED and not (expire and expire < now):
+                    start = slot + self.SLOT.size
+                    keys.append(m[start:start + klen])
+        return keys
+
+    def __iter__(self):
+        for bucket in xrange(self.__buckets):
+            for k in self.__keys(bucket, time.time()):
+                yield cPickle.loads(k)
+
+    def __len__(self):
+        now = time.time()
+        return sum(len(self.__keys(bucket, now))
+                   for bucket in xrange(self.__buckets))
+
+    def __getstate__(self):
+        raise TypeError('Shared cache can not be pickled')
+
+    @property
+    def maxsize(self):
+        """The maximum size of the cache."""
+        return self.__buckets * self.__ways
+
+    @property
+    def currsize(self):
+        """The current size of the cache."""
+        return len(self)
+
+    @property
+    def ttl(self):
+        """The time-to-live value of the cache's items."""
+        return self.__ttl
+
+    def getsizeof(self, value):
+        """Return the size of a cache element's value."""
+        return 1
+
+    @property
+    def evictions(self):
+        """Count of items evicted by this process."""
+        return self.__evictions
+
+    def popitem(self):
+        """Remove and return a `(key, value)` pair."""
+        for key in self:
+            try:
+                return (key, self.pop(key))
+            except KeyError:
+                continue
+        raise KeyError('%s is empty' % self.__class__.__name__)
+
+    def close(self):
+        """Unmap the shared memory and close the backing file."""
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+            os.close(self.__fd)
+
+
+class _HashedTuple(tuple):
+
+    __hashvalue = None
+
+    def __hash__(self, hash=tuple.__hash__):
+        hashvalue = self.__hashvalue
+        if hashvalue is None:
+            self.__hashvalue = hashvalue = hash(self)
+        return hashvalue
+
+    def __add__(self, other, add=tuple.__add__):
+        return _HashedTuple(add(self, other))
+
+    def __radd__(self, other, add=tuple.__add__):
+        return _HashedTuple(add(other, self))
+
+    def __getstate__(self):
+        return {}
+
+
+_kwmark = (object(),)
+
+
+def hashkey(*args, **kwargs):
+    """Return a cache key for the specified hashable arguments."""
+    if kwargs:
+        return _HashedTuple(args + _kwmark + tuple(sorted(kwargs.items())))
+    else:
+        return _HashedTuple(args)
+
+
+def typedkey(*args, **kwargs):
+    """Return a typed cache key for the specified hashable arguments."""
+    key = hashkey(*args, **kwargs)
+    key += tuple(type(v) for v in args)
+    key += tuple(type(v) for _, v in sorted(kwargs.items()))
+    return key
+
+
+CacheInfo = collections.namedtuple('CacheInfo', ['hits', 'misses', 'evictions'])
+
+
+class _Counter(object):
+
+    __slots__ = ('hits', 'misses', 'evictions')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions)
+
+    def clear(self):
+        self.hits = self.misses = self.evictions = 0
+
+
+_dummy_lock = lockutils.DummyLock()
+
+
+def _store(cache, k, v, counter):
+    # evictions counted by cache itself, a mapping without the
+    # counter like dict never evict
+    evictions = getattr(cache, 'evictions', None)
+    try:
+        cache[k] = v
+    except ValueError:
+        return  # value too large
+    if evictions is not None:
+        counter.evictions += cache.evictions - evictions
+
+
+def cached(cache, key=hashkey, lock=None):
+    """Decorator to wrap a function with a memoizing callable that saves
+    results in a cache.
+
+    `lock` should be a greenthread safe lock like `lockutils.RLock`,
+    the lock is not held while the wrapped function is running.
+    The wrapper get `cache_info()` to return hits, misses and evictions.
+    """
+    def decorator(func):
+        counter = _Counter()
+        if cache is None:
+            def wrapper(*args, **kwargs):
+                counter.misses += 1
+                return func(*args, **kwargs)
+        else:
+            _lock = lock if lock is not None else _dummy_lock
+
+            def wrapper(*args, **kwargs):
+                k = key(*args, **kwargs)
+                with _lock:
+                    try:
+                        v = cache[k]
+                    except KeyError:
+                        counter.misses += 1
+                    else:
+                        counter.hits += 1
+                        return v
+                v = func(*args, **kwargs)
+                with _lock:
+                    _store(cache, k, v, counter)
+                return v
+
+        def cache_clear():
+            if cache is not None:
+                with (lock if lock is not None else _dummy_lock):
+                    cache.clear()
+            counter.clear()
+
+        wrapper = six.wraps(func)(wrapper)
+        wrapper.cache = cache
+        wrapper.cache_info = counter.info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+def cachedmethod(cache, key=hashkey, lock=None):
+    """Decorator to wrap a class or instance method with a memoizing
+    callable that saves results in a cache.
+
+    `cache` and `lock` are callables get instance and return the
+    cache and lock object of the instance, `lock` can be None.
+    Counters in `cache_info()` are shared by all instances.
+    """
+    def decorator(method):
+        counter = _Counter()
+
+        def wrapper(self, *args, **kwargs):
+            c = cache(self)
+            if c is None:
+                counter.misses += 1
+                return method(self, *args, **kwargs)
+            _lock = lock(self) if lock is not None else _dummy_lock
+            k = key(*args, **kwargs)
+            with _lock:
+                try:
+                    v = c[k]
+                except KeyError:
+                    counter.misses += 1
+                else:
+                    counter.hits += 1
+                    return v
+            v = method(self, *args, **kwargs)
+            with _lock:
+                _store(c, k, v, counter)
+            return v
+
+        wrapper = six.wraps(method)(wrapper)
+        wrapper.cache_info = counter.info
+        wrapper.cache_clear = counter.clear
+        return wrapper
+    return decorator
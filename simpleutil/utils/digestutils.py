@@ -1,12 +1,24 @@
 import os
+import stat
+import signal
+import time
 import zlib
 import hashlib
+import itertools
 import contextlib
 import six
+import eventlet
+import eventlet.greenio
+import eventlet.tpool
+from six.moves import cPickle
 
 from simpleutil.common import exceptions
+from simpleutil.utils import cachetools
+from simpleutil.utils import systemutils
 
 BLOCK = 4096
+# read size of file digest
+BUFFER = 1024 * 1024
 
 @contextlib.contextmanager
 def openfile(path):
@@ -20,14 +32,123 @@ def openfile(path):
     #     f.close()
 
 
-def filemd5(path):
-    md5_instance = hashlib.md5()
+class Crc32(object):
+    """crc32 with the interface of hashlib"""
+
+    name = 'crc32'
+
+    def __init__(self):
+        self.crc = 0
+
+    def update(self, bytes):
+        self.crc = zlib.crc32(bytes, self.crc)
+
+    def hexdigest(self):
+        return str(self.crc & 0xffffffff)
+
+
+def new(algorithm):
+    """New digest instance, algorithm is crc32 or name of hashlib"""
+    if algorithm == 'crc32':
+        return Crc32()
+    return hashlib.new(algorithm)
+
+
+if six.PY2:
+    def _view(buf, size):
+        return buffer(buf, 0, size)
+else:
+    def _view(buf, size):
+        return memoryview(buf)[:size]
+
+
+def _update(f, instances):
+    buf = bytearray(BUFFER)
+    size = f.readinto(buf)
+    while size:
+        bytes = _view(buf, size)
+        for instance in instances:
+            instance.update(bytes)
+        size = f.readinto(buf)
+
+
+class StreamDigest(object):
+    """Digest data in flight
+
+    write/read pass data to or from fileobj and digest it, so it can be
+    the file object of ZlibStream.compr2fobj or wrap a Recver, chunks
+    can also be fed by update directly.
+    A seek away from the end (zip rewrite its headers) make digests
+    invalid, and digest in a forked process is not seen by parent.
+    """
+
+    def __init__(self, fileobj=None, algorithms=('md5', 'crc32')):
+        self.fileobj = fileobj
+        self.algorithms = algorithms
+        self.instances = [new(algorithm) for algorithm in algorithms]
+        self.size = 0
+        self.seeked = False
+
+    def update(self, bytes):
+        for instance in self.instances:
+            instance.update(bytes)
+        self.size += len(bytes)
+
+    def __call__(self, bytes):
+        self.update(bytes)
+
+    def write(self, bytes):
+        self.fileobj.write(bytes)
+        self.update(bytes)
+
+    def read(self, size=-1):
+        bytes = self.fileobj.read(size)
+        self.update(bytes)
+        return bytes
+
+    def tell(self):
+        if self.fileobj is None:
+            return self.size
+        return self.fileobj.tell()
+
+    def seek(self, pos, whence=0):
+        self.fileobj.seek(pos, whence)
+        if self.fileobj.tell() != self.size:
+            self.seeked = True
+
+    def flush(self):
+        if self.fileobj is not None:
+            self.fileobj.flush()
+
+    def close(self):
+        if self.fileobj is not None:
+            self.fileobj.close()
+
+    def digests(self):
+        """Return dict of algorithm and hexdigest, size in key size"""
+        if self.seeked:
+            raise RuntimeError('Stream seeked, digests invalid')
+        digests = dict((algorithm, instance.hexdigest())
+                       for algorithm, instance in zip(self.algorithms, self.instances))
+        digests['size'] = self.size
+        return digests
+
+
+def filedigests(path, algorithms=('md5', 'crc32'), cache=None):
+    """Digests of file in one read, return dict of algorithm and hexdigest
+    digests of unchanged file come from cache when cache is a DigestCache
+    """
+    if cache is not None:
+        return cache.digests(path, algorithms)
+    instances = [new(algorithm) for algorithm in algorithms]
     with openfile(path) as f:
-        bytes = f.read(BLOCK)
-        while(bytes != six.binary_type('')):
-            md5_instance.update(bytes)
-            bytes = f.read(BLOCK)
-    return md5_instance.hexdigest()
+        _update(f, instances)
+    return dict((algorithm, instance.hexdigest())
+                for algorithm, instance in zip(algorithms, instances))
+
+
+def filemd5(path, cache=None):
+    return filedigests(path, ('md5', ), cache)['md5']
 
 
 def strmd5(buffer):
@@ -36,11 +157,163 @@ def strmd5(buffer):
     return md5_instance.hexdigest()
 
 
-def filecrc32(path):
-    with openfile(path) as f:
-        bytes = f.read(BLOCK)
-        crc = 0
-        while(bytes != six.binary_type('')):
-            crc = zlib.crc32(bytes, crc)
-            bytes = f.read(BLOCK)
-        return str(crc & 0xffffffff)
+def filecrc32(path, cache=None):
+    return filedigests(path, ('crc32', ), cache)['crc32']
+
+
+class DigestCache(object):
+    """Digests of files keyed by (st_dev, st_ino, st_size, st_mtime)
+
+    The index is loaded from path and written back by save, least
+    recently used files drop when over maxsize.
+    File modified in last second is not cached, a write in the same
+    mtime tick would not change the key.
+    """
+
+    def __init__(self, path=None, maxsize=65536):
+        self.path = path
+        self.changed = False
+        self.cache = None
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'rb') as f:
+                    cache = cPickle.load(f)
+                if isinstance(cache, cachetools.LRUCache) and cache.maxsize == maxsize:
+                    self.cache = cache
+            except Exception:
+                # broken index, build a new one
+                pass
+        if self.cache is None:
+            self.cache = cachetools.LRUCache(maxsize)
+
+    @staticmethod
+    def key(st):
+        return st.st_dev, st.st_ino, st.st_size, st.st_mtime
+
+    def digests(self, path, algorithms=('md5', 'crc32')):
+        try:
+            st = os.stat(path)
+        except OSError:
+            raise exceptions.InvalidArgument('file not exist or can not be read')
+        key = self.key(st)
+        digests = self.cache.get(key, {})
+        missing = [algorithm for algorithm in algorithms if algorithm not in digests]
+        if missing:
+            digests = dict(digests)
+            digests.update(filedigests(path, missing))
+            if self.key(os.stat(path)) == key and time.time() - st.st_mtime > 1:
+                self.cache[key] = digests
+                self.changed = True
+        return dict((algorithm, digests[algorithm]) for algorithm in algorithms)
+
+    def clear(self):
+        self.cache.clear()
+        self.changed = True
+
+    def save(self):
+        """Write index to path, the file is replaced in one rename"""
+        if not self.path or not self.changed:
+            return
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'wb') as f:
+            cPickle.dump(self.cache, f, cPickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, self.path)
+        self.changed = False
+
+
+def _digests(paths, algorithms):
+    results = []
+    for path in paths:
+        try:
+            results.append((path, filedigests(path, algorithms)))
+        except (exceptions.InvalidArgument, IOError, OSError):
+            results.append((path, None))
+    return results
+
+
+def _write(w, results):
+    bytes = cPickle.dumps(results, cPickle.HIGHEST_PROTOCOL)
+    while bytes:
+        bytes = bytes[os.write(w, bytes):]
+    os.close(w)
+
+
+def _collect(pid, r, paths, timeout):
+    """Read result of sub process, paths map to None when sub process
+    timeout or exit without a full result
+    """
+    from simpleutil.utils.systemutils import posix
+    bytes = None
+    with eventlet.greenio.GreenPipe(r, 'rb') as f:
+        with eventlet.Timeout(timeout, False):
+            bytes = f.read()
+    if bytes is None:
+        # read timeout, sub process still running
+        bytes = ''
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    try:
+        posix.wait(pid)
+        return cPickle.loads(bytes)
+    except (systemutils.ExitBySIG, systemutils.UnExceptExit,
+            EOFError, ValueError, cPickle.UnpicklingError):
+        return dict.fromkeys(paths)
+
+
+def batch_filedigests(paths, algorithms=('md5', ), processes=4, timeout=None):
+    """Digests of files in sub processes, return dict of path and digests
+    digests of file not exist or can not be read is None, so are digests
+    of files in a sub process timeout or crashed
+    files digest in current process when fork is not supported
+    """
+    paths = list(paths)
+    if not hasattr(os, 'fork') or processes <= 1 or len(paths) <= 1:
+        return dict(_digests(paths, algorithms))
+    pool = eventlet.GreenPool(processes)
+    waiters = []
+    for index in range(min(processes, len(paths))):
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            code = 1
+            try:
+                _write(w, _digests(paths[index::processes], algorithms))
+                code = 0
+            finally:
+                os._exit(code)
+        os.close(w)
+        waiters.append(pool.spawn(_collect, pid, r, paths[index::processes], timeout))
+    results = {}
+    for waiter in waiters:
+        results.update(waiter.wait())
+    return results
+
+
+def _manifest_entry(entry, algorithm, cut):
+    path, st = entry
+    digest = None
+    if stat.S_ISREG(st.st_mode):
+        try:
+            # hashlib and file read release GIL, digest in real thread
+            digest = eventlet.tpool.execute(filedigests, path, (algorithm, ))[algorithm]
+        except (exceptions.InvalidArgument, IOError, OSError):
+            digest = None
+    return path[cut:], st.st_size, st.st_mode, digest
+
+
+def tree_manifest(path, algorithm='md5', workers=8, exclude=None):
+    """Iter manifest of directory, yield (path, size, mode, digest)
+    path is relative to the directory, entries in walk order,
+    digest is None for directory, link, special file and file can not be read
+    exclude is called with relative path, return True to skip the entry,
+    a skipped directory is not entered
+    """
+    if not os.path.isdir(path):
+        raise exceptions.InvalidArgument('path is not directory')
+    cut = len(os.path.join(path, ''))
+    pool = eventlet.GreenPool(workers)
+    return pool.imap(_manifest_entry, systemutils.scantree(path, exclude),
+                     itertools.repeat(algorithm), itertools.repeat(cut))
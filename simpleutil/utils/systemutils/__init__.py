@@ -1,6 +1,7 @@
 # -*- coding: UTF-8 -*-
 import time
-from simpleutil.utils import strutils
+import fnmatch
+import functools
 from simpleutil.utils.systemutils.public import *
 
 PY27 = True if sys.version_info[0:2] >= (2, 7) else False
@@ -20,8 +21,15 @@ def acctime(path):
     return int(os.stat(path).st_atime)
 
 
+def _exclude(excludes, path):
+    name = os.path.basename(path)
+    for pattern in excludes:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(path, pattern):
+            return True
+    return False
+
+
 if POSIX:
-    import subprocess
     from simpleutil.utils.systemutils import posix
 
     is_admin = posix.is_admin
@@ -66,34 +74,39 @@ if POSIX:
         st = os.statvfs(folder)
         return st.f_frsize * st.f_bavail
 
-    DU = find_executable('du')
+    def stat_size(st, apparent=False):
+        """Allocated size of lstat like du, file size when apparent"""
+        return st.st_size if apparent else st.st_blocks * 512
 
-    def directory_size(path, excludes=None, timeout=None):
-        # TODO rewrite with C
-        args = [DU, '-sk']
+    def directory_size(path, excludes=None, timeout=None, apparent=False):
+        """Size of directory in bytes, walk by scandir in process
+        excludes are patterns like du --exclude, match name or relative path
+        hard linked file counted once, yield to eventlet while walking
+        return 0 when path can not be read or timeout
+        """
         if excludes:
             if isinstance(excludes, basestring):
                 excludes = [excludes, ]
-            for exclude in excludes:
-                args.append('--exclude=%s' % exclude)
-        args.append(path)
-        r, w = os.pipe()
-        posix.set_cloexec_flag(r)
-        posix.set_cloexec_flag(w)
-        with open(os.devnull, 'wb') as null:
-            sub = subprocess.Popen(executable=DU, args=args, stdout=w,
-                                   stderr=null.fileno(), close_fds=True)
-        os.close(w)
+            exclude = functools.partial(_exclude, excludes)
+        else:
+            exclude = None
+        overtime = time.time() + timeout if timeout else None
         try:
-            subwait(sub, timeout)
-        except (OSError, ExitBySIG, UnExceptExit):
-            os.close(r)
+            size = stat_size(os.lstat(path), apparent)
+        except OSError:
             return 0
-        except Exception:
-            os.close(r)
-            raise
-        with os.fdopen(r, 'rb') as f:
-            return int(strutils.Split(f.read(512))[0]) * 1024
+        links = set()
+        for count, (entry, st) in enumerate(scantree(path, exclude)):
+            if count % 256 == 0:
+                if overtime and time.time() > overtime:
+                    return 0
+                eventlet.sleep(0)
+            if st.st_nlink > 1 and not stat.S_ISDIR(st.st_mode):
+                if (st.st_dev, st.st_ino) in links:
+                    continue
+                links.add((st.st_dev, st.st_ino))
+            size += stat_size(st, apparent)
+        return size
 
 elif WINDOWS:
     from simpleutil.utils.systemutils import windows
@@ -1,11 +1,16 @@
+import io
 import os
+import errno
+import stat
 import array
 import struct
 import fcntl
 import termios
-import select
 import collections
 
+import eventlet
+import eventlet.hubs
+
 from simpleutil.log import log as logging
 from simpleutil.utils import systemutils
 from simpleutil.utils.systemutils.posix.inotify import event
@@ -28,33 +33,123 @@ def format_path(path):
     return os.path.normpath(path)
 
 
+# same event of same file in one read is merged
+COALESCE_EVENTS = event.IN_MODIFY | event.IN_ACCESS | event.IN_ATTRIB
+
+# wd, mask, cookie, len of struct inotify_event
+_EVENT = struct.Struct('iIII')
+# init size of read buffer, grow with queue size
+BUFFER_SIZE = 65536
+
+
+def _unpack_events(buf, length):
+    """Parse inotify events in buf, yield (wd, mask, cookie, fname)"""
+    offset = 0
+    while offset + _EVENT.size <= length:
+        wd, mask, cookie, fname_len = _EVENT.unpack_from(buf, offset)
+        offset += _EVENT.size
+        fname = ''
+        if fname_len:
+            # name is padded with null
+            end = buf.find('\0', offset, offset + fname_len)
+            fname = str(buf[offset:end if end >= 0 else offset + fname_len])
+        offset += fname_len
+        yield wd, mask, cookie, fname
+
+
+# python parser kept to check the C one
+_py_unpack_events = _unpack_events
+
+try:
+    from simpleutil.utils._cutils import inotify_events as _unpack_events
+except ImportError:
+    pass
+
+
+class Event(object):
+    """Inotify event, path is the watched path, pathname is full path"""
+
+    __slots__ = ('wd', 'mask', 'cookie', 'fname', 'path', 'pathname')
+
+    def __init__(self, wd, mask, cookie, fname, path, pathname):
+        self.wd = wd
+        self.mask = mask
+        self.cookie = cookie
+        self.fname = fname
+        self.path = path
+        self.pathname = pathname
+
+    def __getitem__(self, key):
+        # for callers of events as dict
+        return getattr(self, key)
+
+    def __repr__(self):
+        return '<Event %s %s>' % (event.EventsCodes.maskname(self.mask), self.pathname)
+
+
 class Notifier(object):
+    """Inotify of a file or directory
+
+    event of read_events is Event of wd, mask, cookie, fname, path
+    (the watched path) and pathname (full path of the event), the
+    queue of events is reused by next read
+    add_watch with rec watch every sub directory, with auto_add
+    sub directory created or moved in is watched, moved out is removed
+    """
 
     interval = 1.0
 
-    def __init__(self, path, threshold=0):
+    def __init__(self, path, threshold=0, coalesce=True):
 
-        if not os.path.isfile(path):
-            raise RuntimeError('Just for file')
-        self.path = format_path(path)
+        if path is not None and not os.path.exists(path):
+            raise RuntimeError('Path not exist')
+        self.path = format_path(path) if path is not None else None
         self.inotify =  CtypesLibcINotify()
         self._fd = None
         self._threshold = threshold
-        self.wds = set()
+        self.coalesce = coalesce
+        # wd to watched path
+        self.wds = {}
+        # wd to mask of auto add watch
+        self.autos = {}
+        self._reader = None
+        # greenthread of loop waiting in hub
+        self._waiter = None
+        # fd closed by loop after it leave hub
+        self._closing = None
+        self._buffer = bytearray(BUFFER_SIZE)
+        self._events = collections.deque()
 
     def start(self):
         if self._fd:
             LOG.waring('Do not call notifier start twice')
         else:
             self._fd = self.inotify.inotify_init()
+            eventlet.hubs.notify_opened(self._fd)
+            self._reader = io.FileIO(self._fd, 'rb', closefd=False)
 
     def close(self):
         if not self._fd:
             LOG.waring('Do not call notifier before start')
         else:
             self.del_watch()
-            os.close(self._fd)
-            self._fd = None
+            fd, self._fd = self._fd, None
+            if self._waiter is None:
+                self._close(fd)
+            else:
+                # fd must not be closed while listened by hub
+                self._closing = fd
+                hub = eventlet.hubs.get_hub()
+                hub.schedule_call_global(0, self._wakeup, self._waiter)
+
+    def _close(self, fd):
+        self._reader.close()
+        self._reader = None
+        os.close(fd)
+
+    def _wakeup(self, waiter):
+        if self._waiter is waiter:
+            waiter.throw(eventlet.hubs.IOClosed(errno.EBADF, 'Notifier closed'))
 
     def read_events(self):
         """
@@ -71,56 +166,193 @@ class Notifier(object):
                       self._threshold)
             return
 
-        r = os.read(self._fd, queue_size)
+        if queue_size > len(self._buffer):
+            self._buffer = bytearray(queue_size)
+        length = self._reader.readinto(self._buffer)
         LOG.debug('Event queue size: %d', queue_size)
-        event_queue = collections.deque()
-        rsum = 0  # counter
-        while rsum < queue_size:
-            s_size = 16
-            # Retrieve wd, mask, cookie and fname_len
-            wd, mask, cookie, fname_len = struct.unpack('iIII',
-                                                        r[rsum:rsum+s_size])
-
-            # Retrieve name
-            fname, = struct.unpack('%ds' % fname_len,
-                                   r[rsum + s_size:rsum + s_size + fname_len])
-            rsum += s_size + fname_len
+        event_queue = self._events
+        event_queue.clear()
+        # (wd, fname) to masks merged
+        merged = {}
+        for wd, mask, cookie, fname in _unpack_events(self._buffer, length):
             if mask & event.IN_IGNORED:
+                # watch removed by kernel or rm_watch
+                self.wds.pop(wd, None)
+                self.autos.pop(wd, None)
                 continue
-            rawevent = dict(wd=wd, mask=mask, cookie=cookie, fname=fname)
-            event_queue.append(rawevent)
+            path = self.wds.get(wd)
+            pathname = os.path.join(path, fname) if path and fname else path
+            if self.coalesce:
+                if mask & COALESCE_EVENTS:
+                    masks = merged.setdefault((wd, fname), set())
+                    if mask in masks:
+                        continue
+                    masks.add(mask)
+                else:
+                    # file created, deleted or moved, events after it are new
+                    merged.pop((wd, fname), None)
+            if mask & event.IN_ISDIR and wd in self.autos:
+                if mask & (event.IN_CREATE | event.IN_MOVED_TO):
+                    self._add_tree(pathname, self.autos[wd], True)
+                elif mask & event.IN_MOVED_FROM:
+                    self._del_tree(pathname)
+            event_queue.append(Event(wd, mask, cookie, fname, path, pathname))
         return event_queue
 
     def loop(self, callable):
-        watch_list = [self._fd, ]
-        empty_w_list = []
-        empty_e_list = []
-        while True:
+        """Call callable with events when inotify fd readable, until close"""
+        while self._fd:
+            self._waiter = eventlet.getcurrent()
+            try:
+                # wait in eventlet hub, no poll interval, close wake it up
+                eventlet.hubs.trampoline(self._fd, read=True)
+            except eventlet.hubs.IOClosed:
+                pass
+            finally:
+                self._waiter = None
             if not self._fd:
+                if self._closing is not None:
+                    fd, self._closing = self._closing, None
+                    self._close(fd)
                 break
-            try:
-                # select must be the eventlet.green.select
-                rlist, wlist, errlist = select.select(watch_list, empty_w_list, empty_e_list,
-                                                      timeout=self.interval)
-            except (OSError, IOError):
+            events = self.read_events()
+            if events is None:
+                # under threshold, wait for more events
+                eventlet.sleep(self.interval)
                 continue
-            else:
-                if rlist:
-                    callable(self.read_events())
+            callable(events)
 
-    def add_watch(self, mask):
-        wd = self.inotify.inotify_add_watch(self._fd, self.path, mask)
+    def add_watch(self, mask, path=None, rec=False, auto_add=False):
+        """Watch path, default is path of notifier, return wd of path
+        rec watch sub directories, auto_add watch new sub directories
+        """
+        path = self.path if path is None else format_path(path)
+        wd = self.inotify.inotify_add_watch(self._fd, path, mask)
         if wd < 0:
-            msg = 'add_watch: cannot watch %s WD=%d, %s' % (self.path, wd, self.inotify.str_errno())
+            msg = 'add_watch: cannot watch %s WD=%d, %s' % (path, wd, self.inotify.str_errno())
             LOG.error(msg)
-            raise
-        self.wds.add(wd)
+            raise OSError(self.inotify.get_errno(), msg)
+        self.wds[wd] = path
+        if auto_add:
+            self.autos[wd] = mask
+        if rec and os.path.isdir(path):
+            for entry, st in systemutils.scantree(path):
+                if stat.S_ISDIR(st.st_mode):
+                    self._add_tree(entry, mask, auto_add, rec=False)
         return wd
 
-    def del_watch(self):
-        while self.wds:
-            wd = self.wds.pop()
+    def _add_tree(self, path, mask, auto_add, rec=True):
+        try:
+            self.add_watch(mask, path, rec, auto_add)
+        except OSError:
+            # sub directory removed before watched
+            LOG.debug('Sub directory %s not watched', path)
+
+    def _del_tree(self, path):
+        prefix = os.path.join(path, '')
+        for wd, watched in self.wds.items():
+            if watched == path or watched.startswith(prefix):
+                self.del_watch(wd)
+
+    def del_watch(self, wd=None):
+        """Remove watch of wd, remove all watches when wd is None"""
+        wds = self.wds.keys() if wd is None else [wd]
+        for wd in wds:
+            self.autos.pop(wd, None)
+            if self.wds.pop(wd, None) is None:
+                continue
             ret = self.inotify.inotify_rm_watch(self._fd, wd)
             if ret < 0:
                 msg = 'del_watch: cannot remove WD=%d, %s' % (wd, self.inotify.str_errno())
                 LOG.error(msg)
+
+
+class WatchManager(Notifier):
+    """One inotify fd and one loop shared by many subscribers
+
+    subscribe a path with mask and callback, callback is called with
+    list of events of the path match the mask, resync of subscriber is
+    called when inotify queue overflow, events may be lost.
+    Subscribers of same path share one watch, mask of watch is the
+    union of masks.
+    Call start, then run loop in a greenthread.
+    """
+
+    def __init__(self, threshold=0, coalesce=True):
+        super(WatchManager, self).__init__(None, threshold, coalesce)
+        # wd to list of (mask, callback, resync)
+        self.subscribers = {}
+        # wd to (st_dev, st_ino) of watched file
+        self.inodes = {}
+
+    @staticmethod
+    def _inode(path):
+        try:
+            st = os.stat(path)
+        except (OSError, TypeError):
+            return None
+        return st.st_dev, st.st_ino
+
+    def subscribe(self, path, mask, callback, resync=None):
+        """Subscribe events of path, return wd"""
+        wd = self.add_watch(mask | event.IN_MASK_ADD, path)
+        if wd not in self.subscribers:
+            self.inodes[wd] = self._inode(path)
+        self.subscribers.setdefault(wd, []).append((mask, callback, resync))
+        return wd
+
+    def unsubscribe(self, wd, callback):
+        subscribers = self.subscribers.get(wd)
+        if not subscribers:
+            return
+        subscribers[:] = [subscriber for subscriber in subscribers
+                          if subscriber[1] != callback]
+        if not subscribers:
+            del self.subscribers[wd]
+            self.inodes.pop(wd, None)
+            self.del_watch(wd)
+            return
+        path = self.wds.get(wd)
+        inode = self.inodes.get(wd)
+        if inode is not None and self._inode(path) == inode:
+            # narrow mask of watch to the rest subscribers
+            mask = reduce(lambda x, y: x | y, [subscriber[0] for subscriber in subscribers])
+            self.add_watch(mask, path)
+        # path is another file now, add_watch would watch that file by a
+        # new wd, the watch keep union mask, events are filtered by mask
+        # of subscribers in dispatch
+
+    def dispatch(self, events):
+        if not events:
+            return
+        grouped = {}
+        for rawevent in events:
+            if rawevent.mask & event.IN_Q_OVERFLOW:
+                LOG.warning('Inotify queue overflow, resync %d subscribers', len(self.subscribers))
+                for subscribers in self.subscribers.values():
+                    for mask, callback, resync in subscribers:
+                        if resync:
+                            resync()
+                grouped.clear()
+                continue
+            grouped.setdefault(rawevent.wd, []).append(rawevent)
+        for wd, _events in grouped.iteritems():
+            for mask, callback, resync in self.subscribers.get(wd, ()):
+                matched = [rawevent for rawevent in _events if rawevent.mask & mask]
+                if matched:
+                    try:
+                        callback(matched)
+                    except Exception:
+                        LOG.exception('Inotify subscriber callback error')
+        # watch removed by kernel, file deleted or unmounted
+        for wd in [wd for wd in self.subscribers if wd not in self.wds]:
+            del self.subscribers[wd]
+            self.inodes.pop(wd, None)
+
+    def loop(self, callable=None):
+        super(WatchManager, self).loop(callable or self.dispatch)
+
+    def close(self):
+        self.subscribers.clear()
+        self.inodes.clear()
+        super(WatchManager, self).close()
@@ -0,0 +1,194 @@
+import os
+import stat
+import functools
+
+from simpleutil.log import log as logging
+from simpleutil.utils import systemutils
+from simpleutil.utils.systemutils.posix.inotify import api as inotify
+from simpleutil.utils.systemutils.posix.inotify import event
+
+LOG = logging.getLogger(__name__)
+
+
+class DirectorySizeTracker(object):
+    """Size of directory kept current by inotify events
+
+    The tree is walked once on start, every directory is watched, then
+    create/modify/delete/move events update the size, so size is O(1).
+    Size is counted like systemutils.directory_size, hard linked file
+    counted once. Queue overflow of inotify cause a full walk again.
+    """
+
+    MASK = (event.IN_CREATE | event.IN_DELETE | event.IN_MODIFY |
+            event.IN_ATTRIB | event.IN_CLOSE_WRITE |
+            event.IN_MOVED_FROM | event.IN_MOVED_TO | event.IN_ONLYDIR)
+
+    def __init__(self, path, excludes=None, apparent=False):
+        if not os.path.isdir(path):
+            raise RuntimeError('Just for directory')
+        self.path = inotify.format_path(path)
+        self.apparent = apparent
+        if excludes:
+            if isinstance(excludes, basestring):
+                excludes = [excludes, ]
+            self.exclude = functools.partial(systemutils._exclude, excludes)
+        else:
+            self.exclude = None
+        self.notifier = inotify.Notifier(self.path)
+        # path to inode
+        self.entries = {}
+        # directory to paths in it, drop a subtree without scan all entries
+        self.children = {}
+        # directory to wd of it
+        self.watches = {}
+        # inode to [size, count of path]
+        self.links = {}
+        self._size = 0
+        self._stoped = True
+
+    @property
+    def size(self):
+        return self._size
+
+    @property
+    def stoped(self):
+        return self._stoped
+
+    def _excluded(self, path):
+        if path == self.path or not self.exclude:
+            return False
+        return self.exclude(path[len(self.path) + 1:])
+
+    def _add(self, path, st):
+        inode = (st.st_dev, st.st_ino)
+        size = systemutils.stat_size(st, self.apparent)
+        if self.entries.get(path) != inode:
+            self._remove(path)
+            self.entries[path] = inode
+            if path != self.path:
+                self.children.setdefault(os.path.dirname(path), set()).add(path)
+            record = self.links.get(inode)
+            if record is None:
+                self.links[inode] = [size, 1]
+                self._size += size
+                return
+            record[1] += 1
+        else:
+            record = self.links[inode]
+        # file changed through any link, size of inode updated
+        self._size += size - record[0]
+        record[0] = size
+
+    def _remove(self, path):
+        try:
+            inode = self.entries.pop(path)
+        except KeyError:
+            return
+        children = self.children.get(os.path.dirname(path))
+        if children is not None:
+            children.discard(path)
+        record = self.links[inode]
+        record[1] -= 1
+        if not record[1]:
+            del self.links[inode]
+            self._size -= record[0]
+
+    def _update(self, path):
+        """Stat path again, a new directory is walked and watched"""
+        try:
+            st = os.lstat(path)
+        except OSError:
+            self._remove(path)
+            return
+        if stat.S_ISDIR(st.st_mode) and path not in self.entries:
+            self._scan(path, st)
+        else:
+            self._add(path, st)
+
+    def _watch(self, path):
+        try:
+            self.watches[path] = self.notifier.add_watch(self.MASK, path)
+        except OSError:
+            LOG.warning('Directory %s can not be watched, size may not be current' % path)
+
+    def _scan(self, path, st):
+        # watch before walk, files created while walking are not lost
+        self._watch(path)
+        self._add(path, st)
+        exclude = None
+        if self.exclude:
+            exclude = lambda relpath: self._excluded(os.path.join(path, relpath))
+        for entry, st in systemutils.scantree(path, exclude):
+            if stat.S_ISDIR(st.st_mode):
+                self._watch(entry)
+            self._add(entry, st)
+
+    def _drop(self, path, isdir):
+        """Path removed or moved out, drop entries and watches under it"""
+        self._remove(path)
+        if not isdir:
+            return
+        dirs = [path]
+        while dirs:
+            parent = dirs.pop()
+            wd = self.watches.pop(parent, None)
+            if wd is not None:
+                self.notifier.del_watch(wd)
+            for entry in self.children.pop(parent, ()):
+                self._remove(entry)
+                if entry in self.children or entry in self.watches:
+                    dirs.append(entry)
+
+    def resync(self):
+        """Walk the tree again"""
+        self.notifier.del_watch()
+        self.entries.clear()
+        self.children.clear()
+        self.watches.clear()
+        self.links.clear()
+        self._size = 0
+        try:
+            st = os.lstat(self.path)
+        except OSError:
+            LOG.error('Directory %s of size tracker removed' % self.path)
+            return
+        self._scan(self.path, st)
+
+    def event_notify(self, events):
+        if not events:
+            return
+        for rawevent in events:
+            mask = rawevent.mask
+            if mask & event.IN_Q_OVERFLOW:
+                LOG.warning('Inotify queue overflow, resync size of %s' % self.path)
+                self.resync()
+                return
+            parent = rawevent.path
+            if parent is None:
+                continue
+            if not rawevent.fname:
+                # event of watched directory itself
+                if mask & (event.IN_MODIFY | event.IN_ATTRIB):
+                    self._update(parent)
+                continue
+            path = os.path.join(parent, rawevent.fname)
+            if self._excluded(path):
+                continue
+            if mask & (event.IN_DELETE | event.IN_MOVED_FROM):
+                self._drop(path, mask & event.IN_ISDIR)
+            else:
+                self._update(path)
+            # blocks of directory change with entries
+            self._update(parent)
+
+    def start(self, threadpool):
+        if self._stoped:
+            self.notifier.start()
+            self.resync()
+            threadpool.add_thread(self.notifier.loop, self.event_notify)
+            self._stoped = False
+
+    def stop(self):
+        if not self._stoped:
+            self._stoped = True
+            self.notifier.close()
@@ -1,6 +1,7 @@
 # -*- coding: UTF-8 -*-
 import os
 import sys
+import stat
 import errno
 import eventlet
 import contextlib
@@ -28,6 +29,13 @@ except (ImportError, AttributeError):
 
 INTERVAL = 0.01
 
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
 
 
 class ExitBySIG(Exception):
@@ -86,3 +94,45 @@ def subwait(sub, timeout=None):
                 if code != 0:
                     raise UnExceptExit('sub process exit code %d' % code)
                 break
+
+
+if scandir is not None:
+    def _listdir(path):
+        try:
+            entries = scandir(path)
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                yield entry.path, entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+else:
+    def _listdir(path):
+        try:
+            names = os.listdir(path)
+        except OSError:
+            return
+        for name in names:
+            entry = os.path.join(path, name)
+            try:
+                yield entry, os.lstat(entry)
+            except OSError:
+                continue
+
+
+def scantree(path, exclude=None):
+    """Walk directory tree, yield path and lstat of every entry under path
+    exclude is called with path relative to path, return True to skip the
+    entry, a skipped directory is not entered
+    entries can not be read are skipped
+    """
+    cut = len(os.path.join(path, ''))
+    dirs = [path]
+    while dirs:
+        for entry, st in _listdir(dirs.pop()):
+            if exclude and exclude(entry[cut:]):
+                continue
+            if stat.S_ISDIR(st.st_mode):
+                dirs.append(entry)
+            yield entry, st
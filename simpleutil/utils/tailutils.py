@@ -1,8 +1,12 @@
+import io
 import os
+import stat
 import time
 import eventlet
+import eventlet.event
 import eventlet.hubs
 
+from simpleutil.utils import jsonutils
 from simpleutil.utils.systemutils.posix.inotify import api as inotify
 from simpleutil.utils.systemutils.posix.inotify import event
 
@@ -119,15 +123,23 @@ class TailWithF(object):
     OUTPUTING = 'outputing'
     NROWS = 'nrows'
 
-    interval = 5
+    # seconds to check file without modify event, None wait for event only
+    interval = None
 
     def __init__(self, path,
                  output, pause=None,
-                 rows=20, logger=None):
+                 rows=20, logger=None, manager=None):
+        """manager is a inotify WatchManager shared by tails, loop of
+        manager should be run by owner of manager
+        """
         self.path = path
         self.file = open(path, 'r')
-        self.inotifer = inotify.Notifier(path)
-        self.inotifer.start()
+        self.manager = manager
+        self.inotifer = None
+        if manager is None:
+            self.inotifer = inotify.Notifier(path)
+            self.inotifer.start()
+        self.wd = None
         self.output = output
         self.pause = pause
         self.rows = rows
@@ -192,9 +204,12 @@ class TailWithF(object):
             cb = me.switch
             self.callback = cb
             hub = eventlet.hubs.get_hub()
-            timer = hub.schedule_call_global(self.interval, cb, TIMEOUT)
+            timer = None
+            if self.interval:
+                timer = hub.schedule_call_global(self.interval, cb, TIMEOUT)
             if hub.switch() is not TIMEOUT:
-                timer.cancel()
+                if timer:
+                    timer.cancel()
                 self.callback = None
         return OK
 
@@ -246,38 +261,408 @@ class TailWithF(object):
         return OK
 
     def event_notify(self, events):
-        # event is a mask set
         if events:
-            events.clear()
-            if not self.modify:
-                self.modify = True
-                if self.callback:
-                    cb = self.callback
-                    self.callback = None
-                    hub = eventlet.hubs.get_hub()
-                    hub.schedule_call_global(0, cb, MODIFY)
+            self.resync()
+
+    def resync(self):
+        """File modified or events lost, read file to end"""
+        if not self.modify:
+            self.modify = True
+            if self.callback:
+                cb = self.callback
+                self.callback = None
+                hub = eventlet.hubs.get_hub()
+                hub.schedule_call_global(0, cb, MODIFY)
 
     def start(self, threadpool):
         if self._stoped:
-            self.inotifer.add_watch(event.IN_MODIFY)
             self._automaton()
+            if self.manager is None:
+                self.inotifer.add_watch(event.IN_MODIFY)
+                threadpool.add_thread(self.inotifer.loop, self.event_notify)
+            else:
+                self.wd = self.manager.subscribe(self.path, event.IN_MODIFY,
+                                                 self.event_notify, self.resync)
             threadpool.add_thread(self.runner.run, START)
-            threadpool.add_thread(self.inotifer.loop, self.event_notify)
             self._stoped = False
 
     def stop(self):
         if not self._stoped:
             self._stoped = True
             self.runner.shutoff()
-            eventlet.sleep(self.inotifer.interval)
             if self.callback:
                 cb = self.callback
                 self.callback = None
                 hub = eventlet.hubs.get_hub()
                 hub.schedule_call_global(0, cb, MODIFY)
-            self.inotifer.close()
+            if self.manager is None:
+                self.inotifer.close()
+            elif self.wd is not None:
+                self.manager.unsubscribe(self.wd, self.event_notify)
+                self.wd = None
+            self.file.close()
+
+    @property
+    def stoped(self):
+        return self._stoped
+
+
+class TailLines(object):
+    """Tail -f for busy files, output get lists of complete lines
+
+    Read in large blocks until fstat size of the opened file, lines
+    are framed on newline, carriage return of line end is removed, the
+    partial last line wait for its newline.
+    Lines are sent when batch lines ready or the first pending line
+    wait for latency seconds.
+    """
+
+    def __init__(self, path, output, rows=20,
+                 batch=1024, latency=0.5, block=1048576,
+                 logger=None, manager=None):
+        self.path = path
+        self.output = output
+        self.rows = rows
+        self.batch = batch
+        self.latency = latency
+        self.block = block
+        self.logger = logger
+        self.manager = manager
+        self.file = io.open(path, 'rb', buffering=0)
+        self.inotifer = None
+        if manager is None:
+            self.inotifer = inotify.Notifier(path)
+            self.inotifer.start()
+        self.wd = None
+        self.pos = 0
+        self.partial = ''
+        self.lines = []
+        self.deadline = None
+        self._wakeup = None
+        self._running = False
+        self._stoped = True
+
+    def event_notify(self, events):
+        if events:
+            self.resync()
+
+    def resync(self):
+        """File modified or events lost, read file to end"""
+        if self._wakeup and not self._wakeup.ready():
+            self._wakeup.send(MODIFY)
+
+    def _frame(self, data):
+        if self.partial:
+            data = self.partial + data
+        end = data.rfind('\n')
+        if end < 0:
+            self.partial = data
+            return
+        self.partial = data[end + 1:]
+        lines = data[:end].split('\n')
+        if '\r' in data:
+            lines = [line.rstrip('\r') for line in lines]
+        if not self.lines:
+            self.deadline = time.time() + self.latency
+        self.lines.extend(lines)
+
+    def _last_rows(self):
+        size = os.fstat(self.file.fileno()).st_size
+        if self.rows <= 0 or size < 1:
+            self.pos = size
+            return
+        reader = LastRowsN(self.file, self.rows)
+        self._frame(reader.getbuffer())
+        self.pos = reader.max_pos
+
+    def _truncated(self):
+        """File shrink, return True to go on"""
+        return False
+
+    def _read(self):
+        """Read to end of file, return False when file shrink"""
+        size = os.fstat(self.file.fileno()).st_size
+        if size < self.pos and not self._truncated():
+            return False
+        self.file.seek(self.pos)
+        while self.pos < size:
+            data = self.file.read(min(self.block, size - self.pos))
+            if not data:
+                break
+            self.pos += len(data)
+            self._frame(data)
+            if len(self.lines) >= self.batch:
+                self.flush()
+            # other greenthreads run between blocks
+            eventlet.sleep(0)
+        return True
+
+    def flush(self):
+        if self.lines:
+            lines, self.lines = self.lines, []
+            self.deadline = None
+            self.output(lines)
+
+    def run(self):
+        self._running = True
+        try:
+            self._last_rows()
+            while not self._stoped:
+                # events while reading wake up next wait
+                self._wakeup = eventlet.event.Event()
+                if not self._read():
+                    if self.logger:
+                        self.logger('File %s shrink, stop tail' % self.path)
+                    break
+                if self.lines:
+                    timeout = self.deadline - time.time()
+                    if timeout <= 0:
+                        self.flush()
+                        continue
+                    with eventlet.Timeout(timeout, False):
+                        self._wakeup.wait()
+                    if self.lines and time.time() >= self.deadline:
+                        self.flush()
+                else:
+                    self._wakeup.wait()
+            self.flush()
+        except Exception as e:
+            if self.logger:
+                self.logger('%s %s' % (e.__class__.__name__, str(e)))
+        finally:
+            self._running = False
+            self.stop()
+            self.file.close()
+
+    def start(self, threadpool):
+        if self._stoped:
+            if self.manager is None:
+                self.inotifer.add_watch(event.IN_MODIFY)
+                threadpool.add_thread(self.inotifer.loop, self.event_notify)
+            else:
+                self.wd = self.manager.subscribe(self.path, event.IN_MODIFY,
+                                                 self.event_notify, self.resync)
+            self._stoped = False
+            threadpool.add_thread(self.run)
+
+    def stop(self):
+        if not self._stoped:
+            self._stoped = True
+            if self.manager is None:
+                self.inotifer.close()
+            elif self.wd is not None:
+                self.manager.unsubscribe(self.wd, self.event_notify)
+                self.wd = None
+            self.resync()
+        if not self._running and not self.file.closed:
             self.file.close()
 
     @property
     def stoped(self):
         return self._stoped
+
+
+class TailFollower(TailLines):
+    """TailLines follow the path across rotation and truncation
+
+    A file moved or deleted is kept open after the new file of path is
+    created, writer may still write to it until it reopens the path, the
+    old file is read until no data in grace seconds, then the new file
+    is opened. A truncated file is read from start.
+    (inode, offset) of the last line sent is written to checkpoint file
+    after every output, a new follower with the checkpoint resume from
+    it, or from the rotated file in same directory with that inode.
+    """
+
+    DIR_MASK = event.IN_CREATE | event.IN_MOVED_TO
+
+    def __init__(self, path, output, rows=20,
+                 batch=1024, latency=0.5, block=1048576,
+                 checkpoint=None, grace=1.0, logger=None, manager=None):
+        path = os.path.abspath(path)
+        super(TailFollower, self).__init__(path, output, rows, batch, latency, block,
+                                           logger, manager)
+        self.directory, self.name = os.path.split(path)
+        self.checkpoint = checkpoint
+        self.dir_wd = None
+        self.grace = grace
+        # time to open new file when old file has no more data
+        self._idle = None
+        self._timer = None
+        self._saved = None
+
+    @property
+    def position(self):
+        """inode and offset of the last line sent"""
+        return os.fstat(self.file.fileno()).st_ino, self.pos - len(self.partial)
+
+    def event_notify(self, events):
+        # events of file or file name in directory
+        for rawevent in events:
+            if not rawevent.fname or rawevent.fname == self.name:
+                self.resync()
+                break
+
+    def _watch_file(self):
+        try:
+            if self.manager is None:
+                if self.wd is not None:
+                    self.inotifer.del_watch(self.wd)
+                self.wd = self.inotifer.add_watch(event.IN_MODIFY, self.path)
+            else:
+                if self.wd is not None:
+                    self.manager.unsubscribe(self.wd, self.event_notify)
+                self.wd = self.manager.subscribe(self.path, event.IN_MODIFY,
+                                                 self.event_notify, self.resync)
+        except OSError:
+            # file moved again, event of directory will wake up
+            self.wd = None
+
+    def _save(self):
+        if not self.checkpoint:
+            return
+        position = self.position
+        if position == self._saved:
+            return
+        tmp = self.checkpoint + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(jsonutils.dumps(dict(inode=position[0], offset=position[1])))
+        os.rename(tmp, self.checkpoint)
+        self._saved = position
+
+    def _load(self):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return None
+        try:
+            with open(self.checkpoint, 'rb') as f:
+                position = jsonutils.loads(f.read())
+            return position['inode'], position['offset']
+        except (IOError, ValueError, KeyError, TypeError):
+            if self.logger:
+                self.logger('Checkpoint %s broken, ignore it' % self.checkpoint)
+            return None
+
+    def _rotated_file(self, inode):
+        """Find rotated file of inode in directory"""
+        for name in os.listdir(self.directory):
+            if name == self.name or not name.startswith(self.name):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                continue
+            if st.st_ino == inode and stat.S_ISREG(st.st_mode):
+                return path
+        return None
+
+    def _last_rows(self):
+        position = self._load()
+        if position is None:
+            return super(TailFollower, self)._last_rows()
+        inode, offset = position
+        st = os.fstat(self.file.fileno())
+        if st.st_ino != inode:
+            rotated = self._rotated_file(inode)
+            if rotated is None:
+                # rotated file is gone, current file is all new
+                self.pos = 0
+                return
+            self.file.close()
+            self.file = io.open(rotated, 'rb', buffering=0)
+            st = os.fstat(self.file.fileno())
+            if self.logger:
+                self.logger('Resume from rotated file %s' % rotated)
+        self.pos = offset if offset <= st.st_size else 0
+
+    def _truncated(self):
+        if self.logger:
+            self.logger('File %s truncated, read from start' % self.path)
+        self._drain()
+        self.pos = 0
+        return True
+
+    def _drain(self):
+        """Send partial line of the file to be left"""
+        if self.partial:
+            if not self.lines:
+                self.deadline = time.time() + self.latency
+            self.lines.append(self.partial.rstrip('\r'))
+            self.partial = ''
+        self.flush()
+
+    def _replaced(self):
+        """Path is another file now"""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            # moved or deleted, wait for create
+            return False
+        opened = os.fstat(self.file.fileno())
+        return (st.st_dev, st.st_ino) != (opened.st_dev, opened.st_ino)
+
+    def _reopen(self):
+        """Open the new file of path, return True if opened"""
+        try:
+            fobj = io.open(self.path, 'rb', buffering=0)
+        except IOError:
+            return False
+        self._drain()
+        self.file.close()
+        self.file = fobj
+        self.pos = 0
+        self._watch_file()
+        self._save()
+        if self.logger:
+            self.logger('File %s rotated, follow new file' % self.path)
+        return True
+
+    def _wait_idle(self, delay):
+        # no event when old file get no more data, wake up run by timer
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = eventlet.spawn_after(delay, self.resync)
+
+    def _read(self):
+        while True:
+            pos = self.pos
+            if not super(TailFollower, self)._read():
+                return False
+            if not self._replaced():
+                self._idle = None
+                return True
+            # old file is read until idle before follow the new one
+            now = time.time()
+            if self._idle is None or self.pos != pos:
+                self._idle = now + self.grace
+            if now < self._idle:
+                self._wait_idle(self._idle - now)
+                return True
+            self._idle = None
+            if not self._reopen():
+                return True
+
+    def flush(self):
+        super(TailFollower, self).flush()
+        self._save()
+
+    def start(self, threadpool):
+        if self._stoped:
+            if self.manager is None:
+                self.inotifer.add_watch(self.DIR_MASK, self.directory)
+                threadpool.add_thread(self.inotifer.loop, self.event_notify)
+            else:
+                self.dir_wd = self.manager.subscribe(self.directory, self.DIR_MASK,
+                                                     self.event_notify, self.resync)
+            self._watch_file()
+            self._stoped = False
+            threadpool.add_thread(self.run)
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._stoped and self.manager is not None and self.dir_wd is not None:
+            self.manager.unsubscribe(self.dir_wd, self.event_notify)
+            self.dir_wd = None
+        super(TailFollower, self).stop()
@@ -1,5 +1,8 @@
 import time
 import uuid
+import array
+import types
+import threading
 
 def generate_uuid():
     """Creates a random uuid string.
@@ -33,27 +36,63 @@ def is_uuid_like(val):
         return False
 
 
+class _layoutmethod(object):
+    """Key decoder of a Gprimarykey, decode by layout of the instance,
+    called on the class like the old staticmethod decoders, decode by
+    the default layout
+    """
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            instance = owner._default_layout()
+        return types.MethodType(self.func, instance, owner)
+
+
 class Gprimarykey(object):
     """A global primark key maker like Snowflake
-    0-42    time                   42  bit
-    42-53   sid       max 2047     11  bit
-    53-61   pid       max 255      8   bit
-    61-64   sequence  max 7        3   bit
+    default layout, from high bit to low bit
+    time                   42  bit
+    sid       max 2047     11  bit
+    pid       max 255      8   bit
+    sequence  max 7        3   bit
+
+    sid_bits, pid_bits and sequence_bits change the layout, time takes
+    the rest of 64 bit, must not less then 41 bit
+    when sequence of one millisecond used up, keys borrow sequence from
+    next millisecond, when clock go backward, keys keep on last time,
+    so makekey never sleep, time part of key may run ahead of clock
+    when keys made faster then 1000 << sequence_bits per second
     """
-    def __init__(self):
+    def __init__(self, sid=0, pid=0, sid_bits=11, pid_bits=8, sequence_bits=3):
+        if 64 - sid_bits - pid_bits - sequence_bits < 41:
+            raise ValueError('Time part of key less then 41 bit')
+        if min(sid_bits, pid_bits, sequence_bits) < 0:
+            raise ValueError('Bits of key part less then 0')
+        self.__sid_bits = sid_bits
+        self.__pid_bits = pid_bits
+        self.__sequence_bits = sequence_bits
+        self.__pid_shift = sequence_bits
+        self.__sid_shift = sequence_bits + pid_bits
+        self.__time_shift = sequence_bits + pid_bits + sid_bits
         self.__sid = 0
         self.__pid = 0
         self.__sequence = 0
         self.__last = 0
+        self.__lock = threading.Lock()
+        self.update_sid(sid)
+        self.update_pid(pid)
 
     def update_sid(self, sid):
-        if sid >= 2048:
-            raise RuntimeError('sid should less then 2048')
+        if sid >= 1 << self.__sid_bits:
+            raise RuntimeError('sid should less then %d' % (1 << self.__sid_bits))
         self.__sid = sid
 
     def update_pid(self, pid):
-        if pid >= 256:
-            raise RuntimeError('pid should less then 256')
+        if pid >= 1 << self.__pid_bits:
+            raise RuntimeError('pid should less then %d' % (1 << self.__pid_bits))
         self.__pid = pid
 
     @property
@@ -67,35 +106,107 @@ class Gprimarykey(object):
     def __call__(self):
         return self.makekey(self.__sid, self.__pid)
 
+    def __reserve(self, count):
+        """Reserve count sequence, return time and sequence of the first one"""
+        size = 1 << self.__sequence_bits
+        cur = int(time.time() * 1000)
+        with self.__lock:
+            if cur > self.__last:
+                self.__last = cur
+                self.__sequence = 0
+            # clock go backward or sequence of last used up
+            # continue from last time and sequence
+            last, sequence = self.__last, self.__sequence
+            end = sequence + count
+            self.__last += end // size
+            self.__sequence = end % size
+        return last, sequence
+
+    def __prefix(self, sid, pid):
+        if sid >= 1 << self.__sid_bits or pid >= 1 << self.__pid_bits:
+            raise RuntimeError('sid should less then %d pid should less then %d' %
+                               (1 << self.__sid_bits, 1 << self.__pid_bits))
+        return (sid << self.__sid_shift) | (pid << self.__pid_shift)
+
     def makekey(self, sid=0, pid=0):
         """Make a global primark key"""
-        if pid >= 256 or sid >= 2048:
-            raise RuntimeError('sid should less then 2048 pid should less then 256')
-        cur = int(time.time() * 1000)
-        if self.__last == cur:
-            if self.__sequence >= 8:
-                time.sleep(0.001)
-                # recursive call
-                return self.makekey(sid, pid)
-            else:
-                self.__sequence += 1
-        else:
-            self.__sequence = 0
-            self.__last = cur
-        # over time at 4398046511103 == 2109-05-15 15:35:11
-        part_time = cur << 22
-        part_server = sid << 11
-        part_pid = pid << 3
-        key = part_time | part_server | part_pid | self.__sequence
-        return key
-
-    @staticmethod
-    def timeformat(key):
-        return key >> 22
-
-    @staticmethod
-    def sidformat(key):
-        return (key & (2047 << 11)) >> 11
+        prefix = self.__prefix(sid, pid)
+        cur, sequence = self.__reserve(1)
+        # over time at 4398046511103 == 2109-05-15 15:35:11 for 42 bit time
+        return (cur << self.__time_shift) | prefix | sequence
+
+    def makekeys(self, count, sid=None, pid=None):
+        """Make count global primark keys in one reserve, keys are ascending
+        sid and pid default to the sid and pid of this maker
+        """
+        if count <= 0:
+            return []
+        sid = self.__sid if sid is None else sid
+        pid = self.__pid if pid is None else pid
+        prefix = self.__prefix(sid, pid)
+        cur, sequence = self.__reserve(count)
+        size = 1 << self.__sequence_bits
+        time_shift = self.__time_shift
+        keys = []
+        while count > 0:
+            part_time = (cur << time_shift) | prefix
+            end = min(size, sequence + count)
+            keys.extend(part_time | seq for seq in xrange(sequence, end))
+            count -= end - sequence
+            cur += 1
+            sequence = 0
+        return keys
+
+    __default = None
+
+    @classmethod
+    def _default_layout(cls):
+        if cls.__default is None:
+            cls.__default = Gprimarykey()
+        return cls.__default
+
+    @_layoutmethod
+    def timeformat(self, key):
+        return key >> self.__time_shift
+
+    @_layoutmethod
+    def sidformat(self, key):
+        return (key >> self.__sid_shift) & ((1 << self.__sid_bits) - 1)
+
+    @_layoutmethod
+    def pidformat(self, key):
+        return (key >> self.__pid_shift) & ((1 << self.__pid_bits) - 1)
+
+    @_layoutmethod
+    def sequenceformat(self, key):
+        return key & ((1 << self.__sequence_bits) - 1)
+
+    def decode(self, keys):
+        """Decode keys to columns of time, sid, pid and sequence
+        columns are array with same typecode when keys is array.array
+        otherwise columns are list, keys can be any iterable
+        """
+        if not isinstance(keys, (list, tuple, array.array)):
+            keys = list(keys)
+        time_shift, sid_shift, pid_shift = self.__time_shift, self.__sid_shift, self.__pid_shift
+        sid_mask = (1 << self.__sid_bits) - 1
+        pid_mask = (1 << self.__pid_bits) - 1
+        sequence_mask = (1 << self.__sequence_bits) - 1
+        columns = ([key >> time_shift for key in keys],
+                   [(key >> sid_shift) & sid_mask for key in keys],
+                   [(key >> pid_shift) & pid_mask for key in keys],
+                   [key & sequence_mask for key in keys])
+        if isinstance(keys, array.array):
+            return tuple(array.array(keys.typecode, column) for column in columns)
+        return columns
+
+    def keyrange(self, start, end):
+        """Key range of time window [start, end) in millisecond
+        keys made in the window match start_key <= key < end_key
+        """
+        if start > end:
+            raise ValueError('Start time over end time')
+        return start << self.__time_shift, end << self.__time_shift
 
 
 Gkey = Gprimarykey()
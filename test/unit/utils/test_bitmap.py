@@ -23,3 +23,60 @@ b = [x for x in bt.all(reverse=True)]
 
 print a
 print b
+
+bt2 = BitMap(3000)
+bt2.add_many([6, 8, 59, 2999])
+print bt2.has_many([6, 7, 8])
+try:
+    bt2.has_many([1.5])
+except TypeError as e:
+    print 'has_many float', e
+print bt.count(), bt2.count()
+print [x for x in (bt | bt2).all()]
+print [x for x in (bt & bt2).all()]
+print [x for x in (bt ^ bt2).all()]
+print [x for x in (bt - bt2).all()]
+bt2.remove(2999)
+print bt2.has(2999)
+
+print bt.next_set(20), bt.next_set(73), bt.next_clear(6), bt.prev_set(50)
+
+
+from simpleutil.utils.bitmap import CompressedBitMap
+
+cbt = CompressedBitMap(1 << 40)
+cbt.add(59)
+cbt.add(1 << 39)
+cbt.add_many(xrange(100000, 200000))
+print cbt.has(59), cbt.has(60), cbt.count(), cbt.nbytes()
+cbt.optimize()
+print cbt.nbytes()
+cbt2 = CompressedBitMap.from_bytes(cbt.to_bytes())
+print cbt2.count(), [x for x in cbt2.all(reverse=True)][:2]
+
+
+import os
+import tempfile
+from simpleutil.utils.bitmap import MmapBitMap
+
+b = BitMap(1000)
+b.add(3)
+b.add(999)
+print 'from_bytes', list(BitMap.from_bytes(b.to_bytes()).all())
+
+path = os.path.join(tempfile.gettempdir(), 'test_bitmap.map')
+m = MmapBitMap(path, 1000)
+m.add(10)
+m.flush()
+del m
+m = MmapBitMap(path)
+print 'mmap', m.max, list(m.all()), list((m | b).all())
+m |= b
+m -= BitMap.from_bytes(b.to_bytes())
+m ^= b
+m.flush()
+del m
+m = MmapBitMap(path)
+print 'mmap inplace', type(m).__name__, list(m.all())
+del m
+os.remove(path)
@@ -0,0 +1,117 @@
+from simpleutil.utils.cachetools import LRUCache
+from simpleutil.utils.cachetools import LFUCache
+from simpleutil.utils.cachetools import RRCache
+
+
+lru = LRUCache(3)
+lru[1] = 'a'
+lru[2] = 'b'
+lru[3] = 'c'
+lru[1]
+lru[4] = 'd'
+print 'lru', sorted(lru)
+
+
+lfu = LFUCache(3)
+lfu[1] = 'a'
+lfu[2] = 'b'
+lfu[3] = 'c'
+lfu[1]
+lfu[1]
+lfu[2]
+lfu[4] = 'd'
+print 'lfu', sorted(lfu)
+
+
+rr = RRCache(100)
+for i in xrange(1000):
+    rr[i] = i
+print 'rr', len(rr), rr.currsize
+
+
+from simpleutil.utils import cachetools
+from simpleutil.utils import lockutils
+
+
+@cachetools.cached(LRUCache(2), lock=lockutils.RLock())
+def add(x, y=1):
+    return x + y
+
+add(1)
+add(1)
+add(2)
+add(3)
+print 'cached', add.cache_info()
+
+
+@cachetools.cached(cachetools.SharedCache(8, ways=4))
+def mul(x):
+    return x * 2
+
+for i in xrange(20):
+    mul(i)
+print 'shared cached', mul.cache_info()
+
+
+lru.enable_stats('lru')
+lru[1]
+lru[4]
+print 'stats', cachetools.cache_stats()
+
+
+import eventlet
+
+loads = []
+
+
+def slow_load(key):
+    loads.append(key)
+    eventlet.sleep(0.05)
+    return key * 2
+
+sf = cachetools.TTLCache(10, 10, missing=slow_load, singleflight=True)
+pool = eventlet.GreenPool()
+print 'singleflight', list(pool.imap(sf.__getitem__, [1] * 5)), loads
+
+del loads[:]
+with eventlet.Timeout(0.01, False):
+    sf[2]
+print 'singleflight timeout', sf[2], loads
+
+
+swr = cachetools.TTLCache(2, 0.05, missing=lambda key: key.upper(), hard_ttl=10)
+swr['a'] = 'a'
+swr['b'] = 'b'
+eventlet.sleep(0.1)
+swr.pop('a')
+swr['c'] = 'c'
+swr['d'] = 'd'
+eventlet.sleep(0.01)
+print 'stale removed', sorted(swr)
+
+
+import os
+
+shared = cachetools.SharedCache(64)
+shared['parent'] = [1, 2]
+pid = os.fork()
+if pid == 0:
+    shared['child'] = shared['parent'] + [3]
+    os._exit(0)
+os.waitpid(pid, 0)
+print 'shared', shared['child'], len(shared)
+shared.close()
+
+
+def slow_upper(key):
+    eventlet.sleep(0.05)
+    return key.upper()
+
+swr = cachetools.TTLCache(2, 0.05, missing=slow_upper, hard_ttl=10)
+swr['a'] = 'a'
+eventlet.sleep(0.1)
+swr['a']
+eventlet.sleep(0.01)
+del swr['a']
+eventlet.sleep(0.1)
+print 'stale removed while loading', sorted(swr)
@@ -5,4 +5,47 @@ from simpleutil.utils import digestutils
 src = r'C:\Users\loliz_000\Desktop\backup\wtf.tar.gz'
 
 print digestutils.filecrc32(src)
-print digestutils.filemd5(src)
\ No newline at end of file
+print digestutils.filemd5(src)
+print digestutils.filedigests(__file__, ('md5', 'crc32', 'sha1'))
+print digestutils.batch_filedigests([__file__, 'not_exist_file'], processes=2)
+
+import os
+import time
+import tempfile
+
+# open of fifo without writer never return, sub process timeout
+fifo = os.path.join(tempfile.gettempdir(), 'test_digestutils.fifo')
+os.mkfifo(fifo)
+print digestutils.batch_filedigests([__file__, fifo], processes=2, timeout=0.5)
+os.remove(fifo)
+from simpleutil.utils.zlibutils.compress import ZlibStream
+
+dst = os.path.join(tempfile.gettempdir(), 'test_digestutils.tar.gz')
+with open(dst, 'wb') as f:
+    stream = digestutils.StreamDigest(f)
+    ZlibStream(os.path.dirname(os.path.abspath(__file__)), 'gz').compr2fobj(stream)
+print stream.digests()
+print digestutils.filedigests(dst), os.path.getsize(dst)
+os.remove(dst)
+
+index = os.path.join(tempfile.gettempdir(), 'test_digestutils.index')
+old = os.path.join(tempfile.gettempdir(), 'test_digestutils.old')
+new = os.path.join(tempfile.gettempdir(), 'test_digestutils.new')
+for path in (old, new):
+    with open(path, 'wb') as f:
+        f.write(path)
+# file modified in last second is not cached
+os.utime(old, (time.time() - 10, time.time() - 10))
+cache = digestutils.DigestCache(index)
+print digestutils.filemd5(old, cache), digestutils.filecrc32(old, cache)
+print digestutils.filemd5(new, cache)
+cache.save()
+cache = digestutils.DigestCache(index)
+print len(cache.cache), cache.digests(old, ('md5', 'crc32'))
+os.remove(index)
+os.remove(old)
+os.remove(new)
+
+for line in digestutils.tree_manifest(os.path.dirname(os.path.abspath(__file__)), 'sha1', workers=4,
+                                     exclude=lambda path: path.endswith('.pyc')):
+    print line
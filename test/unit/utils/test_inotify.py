@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+
+import eventlet
+
+from simpleutil.utils import threadgroup
+from simpleutil.utils import systemutils
+from simpleutil.utils.systemutils.posix.inotify.tracker import DirectorySizeTracker
+
+
+pool = threadgroup.ThreadGroup(50)
+
+
+def write(path, size, mode='wb'):
+    with open(path, mode) as f:
+        f.write('x' * size)
+
+
+root = tempfile.mkdtemp()
+os.makedirs(os.path.join(root, 'a', 'b'))
+write(os.path.join(root, 'a', 'file'), 10000)
+
+tracker = DirectorySizeTracker(root)
+tracker.start(pool)
+eventlet.sleep(0.1)
+
+
+def check(name):
+    eventlet.sleep(0.2)
+    print 'tracker', name, tracker.size == systemutils.directory_size(root)
+
+check('start')
+write(os.path.join(root, 'a', 'b', 'new'), 50000)
+check('create')
+write(os.path.join(root, 'a', 'file'), 200000, 'ab')
+check('modify')
+os.link(os.path.join(root, 'a', 'file'), os.path.join(root, 'link'))
+check('hard link')
+write(os.path.join(root, 'link'), 200000, 'ab')
+check('modify by link')
+os.unlink(os.path.join(root, 'a', 'file'))
+check('unlink')
+os.rename(os.path.join(root, 'a', 'b'), os.path.join(root, 'b'))
+write(os.path.join(root, 'b', 'moved'), 30000)
+check('move')
+shutil.rmtree(os.path.join(root, 'a'))
+check('rmtree')
+tracker.stop()
+shutil.rmtree(root)
+
+
+from simpleutil.utils.systemutils.posix.inotify import api
+from simpleutil.utils.systemutils.posix.inotify import event
+
+root = tempfile.mkdtemp()
+os.makedirs(os.path.join(root, 'a', 'b'))
+received = []
+notifier = api.Notifier(root)
+notifier.start()
+notifier.add_watch(event.IN_CREATE | event.IN_MODIFY, rec=True, auto_add=True)
+print 'rec', sorted(path[len(root):] for path in notifier.wds.values())
+pool.add_thread(notifier.loop, lambda events: received.extend((e.mask, e.pathname) for e in events))
+os.makedirs(os.path.join(root, 'a', 'new'))
+eventlet.sleep(0.1)
+print 'auto add', os.path.join(root, 'a', 'new') in notifier.wds.values()
+path = os.path.join(root, 'a', 'new', 'file')
+del received[:]
+with open(path, 'wb') as f:
+    for i in xrange(5):
+        f.write('x')
+        f.flush()
+eventlet.sleep(0.1)
+print 'coalesce', [(event.EventsCodes.maskname(mask), name == path) for mask, name in received]
+notifier.close()
+shutil.rmtree(root)
+
+
+import struct
+
+buf = bytearray(4096)
+length = 0
+for wd, mask, cookie, name in [(1, event.IN_MODIFY, 0, ''),
+                               (2, event.IN_CREATE | event.IN_ISDIR, 0, 'dir'),
+                               (1, event.IN_MOVED_FROM, 7, 'a' * 16),
+                               (1, event.IN_MOVED_TO, 7, 'b' * 20)]:
+    size = (len(name) + 16) // 16 * 16 if name else 0
+    data = struct.pack('iIII', wd, mask, cookie, size) + name.ljust(size, '\0')
+    buf[length:length + len(data)] = data
+    length += len(data)
+print 'unpack', api._unpack_events is not api._py_unpack_events, \
+    list(api._unpack_events(buf, length)) == list(api._py_unpack_events(buf, length))
+
+
+import time
+
+root = tempfile.mkdtemp()
+notifier = api.Notifier(root)
+notifier.start()
+notifier.add_watch(event.IN_CREATE)
+fd = notifier._fd
+thread = eventlet.spawn(notifier.loop, lambda events: None)
+eventlet.sleep(0.1)
+start = time.time()
+notifier.close()
+thread.wait()
+try:
+    os.fstat(fd)
+    closed = False
+except OSError:
+    closed = True
+print 'close wake loop', time.time() - start < 0.1, closed
+shutil.rmtree(root)
+
+
+root = tempfile.mkdtemp()
+path = os.path.join(root, 'shared')
+write(path, 1)
+manager = api.WatchManager()
+manager.start()
+pool.add_thread(manager.loop)
+got = {'modify': [], 'attrib': [], 'resync': []}
+modify = lambda events: got['modify'].extend(events)
+attrib = lambda events: got['attrib'].extend(events)
+wd1 = manager.subscribe(path, event.IN_MODIFY, modify, lambda: got['resync'].append('modify'))
+wd2 = manager.subscribe(path, event.IN_ATTRIB, attrib, lambda: got['resync'].append('attrib'))
+write(path, 1, 'ab')
+os.chmod(path, 0o600)
+eventlet.sleep(0.1)
+print 'shared', wd1 == wd2, len(got['modify']), len(got['attrib'])
+manager.dispatch([api.Event(-1, event.IN_Q_OVERFLOW, 0, '', None, None)])
+print 'overflow resync', sorted(got['resync'])
+# rotated, path is another file
+os.rename(path, path + '.1')
+write(path, 1)
+manager.unsubscribe(wd2, attrib)
+print 'unsubscribe rotated', manager.wds.keys() == [wd1]
+write(path + '.1', 1, 'ab')
+eventlet.sleep(0.1)
+print 'old file', len(got['modify'])
+manager.unsubscribe(wd1, modify)
+print 'unsubscribe all', manager.wds, manager.subscribers
+manager.close()
+shutil.rmtree(root)
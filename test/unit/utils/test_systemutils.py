@@ -16,3 +16,9 @@ print 'b', y
 print 'kb',y/1024
 print 'mb',y/(1024*1024)
 print 'gb',y/(1024*1024*1024)
+
+
+from simpleutil.utils.systemutils import directory_size
+
+print 'directory_size', directory_size('/usr/lib'), directory_size('/usr/lib', apparent=True)
+print 'exclude', directory_size('/usr/lib', excludes=['*.so', 'python*'], timeout=10)
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+
+import eventlet
+
+from simpleutil.utils import threadgroup
+from simpleutil.utils.tailutils import TailLines
+
+
+pool = threadgroup.ThreadGroup(50)
+root = tempfile.mkdtemp()
+path = os.path.join(root, 'busy.log')
+
+
+def write(path, text, mode='ab'):
+    with open(path, mode) as f:
+        f.write(text)
+
+
+write(path, ''.join('old %d\r\n' % i for i in xrange(100)), 'wb')
+batches = []
+tail = TailLines(path, batches.append, rows=3, batch=10, latency=0.2)
+tail.start(pool)
+eventlet.sleep(0.1)
+print 'last rows wait latency', batches
+eventlet.sleep(0.2)
+print 'last rows', batches
+del batches[:]
+write(path, ''.join('new %d\n' % i for i in xrange(25)) + 'partial')
+eventlet.sleep(0.05)
+# over batch lines sent before latency
+print 'batch', [len(lines) for lines in batches], tail.partial
+write(path, ' done\nlast 1\nlast 2\n')
+eventlet.sleep(0.05)
+print 'wait latency', len(batches)
+eventlet.sleep(0.3)
+print 'latency', batches[-1]
+tail.stop()
+pool.wait()
+print 'stop', tail.file.closed
+shutil.rmtree(root)
+
+
+from simpleutil.utils.tailutils import TailFollower
+from simpleutil.utils.systemutils.posix.inotify import api
+
+root = tempfile.mkdtemp()
+path = os.path.join(root, 'app.log')
+checkpoint = os.path.join(root, 'checkpoint')
+
+for manager in (None, api.WatchManager()):
+    if manager is not None:
+        manager.start()
+        pool.add_thread(manager.loop)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    write(path, 'a1\n', 'wb')
+    got = []
+    tail = TailFollower(path, got.extend, rows=0, latency=0.05, grace=0.2,
+                        checkpoint=checkpoint, manager=manager)
+    tail.start(pool)
+    eventlet.sleep(0.1)
+    write(path, 'b1\nb2 part')
+    eventlet.sleep(0.1)
+    # logrotate create, writer keep writing the rotated file for a while
+    os.rename(path, path + '.1')
+    write(path, 'c1\n', 'wb')
+    eventlet.sleep(0.1)
+    write(path + '.1', 'ial\nb3\n')
+    eventlet.sleep(0.4)
+    write(path, 'c2\n')
+    eventlet.sleep(0.1)
+    # copytruncate
+    with open(path, 'r+b') as f:
+        f.truncate(0)
+    write(path, 'd1\n')
+    eventlet.sleep(0.2)
+    print 'follow', manager is not None, got
+    tail.stop()
+    # write while stopped, then rotate
+    write(path, 'e1\n')
+    os.rename(path, path + '.2')
+    write(path, 'f1\n', 'wb')
+    got = []
+    tail = TailFollower(path, got.extend, rows=5, latency=0.05, grace=0.1,
+                        checkpoint=checkpoint, manager=manager)
+    tail.start(pool)
+    eventlet.sleep(0.4)
+    print 'resume', manager is not None, got
+    tail.stop()
+    if manager is not None:
+        manager.close()
+
+pool.wait()
+shutil.rmtree(root)
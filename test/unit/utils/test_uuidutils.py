@@ -10,6 +10,7 @@ print 'primary key', key
 print 'time.time',t
 print 'timeformat', guid.timeformat(key)
 print 'sid format', guid.sidformat(key)
+print 'class format', Gprimarykey.timeformat(key), Gprimarykey.sidformat(key)
 
 # while True:
 #     x = guid()
@@ -18,4 +19,21 @@ print 'sid format', guid.sidformat(key)
 x = '1'*11 + '0'*11
 
 x = int(x, 2)
-print 'max', x
\ No newline at end of file
+print 'max', x
+
+keys = guid.makekeys(1000)
+print 'makekeys', len(set(keys)), keys == sorted(keys), guid.pidformat(keys[0])
+
+guid = Gprimarykey(sid=1, pid=2, sid_bits=8, pid_bits=4, sequence_bits=10)
+print 'layout', guid.sidformat(guid()), guid.pidformat(guid())
+
+
+import array
+
+keys = guid.makekeys(5)
+print 'decode', guid.decode(keys)[1:]
+print 'decode array', guid.decode(array.array('L', keys))[3]
+now = int(time.time() * 1000)
+start, end = guid.keyrange(now - 1000, now + 1000)
+print 'keyrange', all(start <= key < end for key in keys)
+print 'decode iter', guid.decode(iter(keys))[1:]